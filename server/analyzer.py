@@ -1,41 +1,99 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import os
+import argparse
+import threading
+from embedding_cache import EmbeddingStore
+from vector_index import make_index
+
+EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output", "embeddings")
 
 class EducationalAnalyzer:
-    def __init__(self):
-        # Lightweight model (22MB) that works offline after first download
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, model_name='all-MiniLM-L6-v2', embedding_cache_dir=EMBEDDING_CACHE_DIR, index_kind='exact'):
+        # Lightweight model (22MB) that works offline after first download;
+        # loaded on first use so constructing the analyzer is cheap
+        self.model_name = model_name
+        self._model = None
+        self._model_lock = threading.Lock()
+        # Segment embeddings persist across restarts; None disables the cache
+        self.embedding_store = EmbeddingStore(embedding_cache_dir, model_name) if embedding_cache_dir else None
         self.knowledge_base = {}  # Stores all learning materials
+        # Vector index over the knowledge base: 'exact' always brute-forces;
+        # 'ivf' is approximate once the corpus is large enough to train, and
+        # can miss close matches, so grading only uses it when asked to
+        self.index_kind = index_kind
         self.concept_threshold = 0.7  # Minimum similarity to consider concepts matched
         
+    @property
+    def model(self):
+        """The SentenceTransformer, loaded on first access"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+    
     def preprocess(self, text):
         """Basic text normalization"""
         return ' '.join(text.lower().split())
     
-    def build_knowledge_base(self, lecture_text, textbook_text):
+    def build_knowledge_base(self, lecture_text, textbook_text, batch_size=64):
         """Create unified knowledge representation"""
-        # Segment and embed both sources
-        lecture_segments = self._segment_text(lecture_text)
-        textbook_segments = self._segment_text(textbook_text)
-        
-        # Create combined knowledge base
         self.knowledge_base = {
-            'lecture': {
-                'segments': lecture_segments,
-                'embeddings': self.model.encode(lecture_segments)
-            },
-            'textbook': {
-                'segments': textbook_segments,
-                'embeddings': self.model.encode(textbook_segments)
-            },
-            'combined_embeddings': None
+            'lecture': {'segments': [], 'embeddings': None},
+            'textbook': {'segments': [], 'embeddings': None},
+            'combined_embeddings': None,
+            'all_segments': [],
+            'sources': [],  # 'lecture' or 'textbook' for each entry of all_segments
+            'index': make_index(self.index_kind)
         }
+        self.add_material(lecture_text, textbook_text, batch_size)
+    
+    def add_material(self, lecture_text="", textbook_text="", batch_size=64):
+        """Append newly ingested lecture/textbook text to the knowledge base"""
+        if not self.knowledge_base:
+            return self.build_knowledge_base(lecture_text, textbook_text, batch_size)
+        
+        # Segment both sources
+        lecture_segments = self._segment_text(lecture_text) if lecture_text else []
+        textbook_segments = self._segment_text(textbook_text) if textbook_text else []
+        new_segments = lecture_segments + textbook_segments
+        if not new_segments:
+            return
         
-        # Create combined embeddings for comprehensive search
-        all_segments = lecture_segments + textbook_segments
-        self.knowledge_base['combined_embeddings'] = self.model.encode(all_segments)
-        self.knowledge_base['all_segments'] = all_segments
+        # Embed every new segment exactly once, in a single batched call
+        # (segments already in the embedding store are not re-encoded)
+        new_embeddings = np.ascontiguousarray(
+            self._encode_segments(new_segments, batch_size),
+            dtype=np.float32
+        )
+        split = len(lecture_segments)
+        
+        kb = self.knowledge_base
+        for source, segments, embeddings in (
+            ('lecture', lecture_segments, new_embeddings[:split]),
+            ('textbook', textbook_segments, new_embeddings[split:])
+        ):
+            if not segments:
+                continue
+            kb[source]['segments'] = kb[source]['segments'] + segments
+            previous = kb[source]['embeddings']
+            kb[source]['embeddings'] = embeddings if previous is None else np.concatenate([previous, embeddings])
+        
+        previous = kb['combined_embeddings']
+        kb['combined_embeddings'] = new_embeddings if previous is None else np.concatenate([previous, new_embeddings])
+        kb['all_segments'] = kb['all_segments'] + new_segments
+        kb['sources'] = kb['sources'] + ['lecture'] * len(lecture_segments) + ['textbook'] * len(textbook_segments)
+        
+        # Unit-length vectors go into the search index, ids follow all_segments
+        kb['index'].add(self._normalize(new_embeddings))
+    
+    def _encode_segments(self, segments, batch_size=64):
+        """Batched encode, served from the on-disk store where possible"""
+        encode = lambda texts: self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        if self.embedding_store is None or not segments:
+            return encode(segments)
+        return self.embedding_store.encode(segments, encode)
     
     def _segment_text(self, text, sentences_per_segment=2):
         """Split text into meaningful chunks"""
@@ -48,23 +106,18 @@ class EducationalAnalyzer:
     
     def analyze_question(self, question_text):
         """Understand what the question is asking"""
-        question_embedding = self.model.encode(self.preprocess(question_text))
-        
-        # Find most relevant concepts from knowledge base
-        similarities = cosine_similarity(
-            [question_embedding],
-            self.knowledge_base['combined_embeddings']
-        )[0]
+        question_embedding = self._normalize(self.model.encode([self.preprocess(question_text)]))
         
-        top_indices = np.argsort(similarities)[-3:][::-1]  # Top 3 matches
+        # Find most relevant concepts from knowledge base (top 3 matches)
+        top_indices, similarities = self.knowledge_base['index'].search(question_embedding, 3)
         relevant_concepts = []
         
-        for idx in top_indices:
-            if similarities[idx] > self.concept_threshold:
+        for idx, similarity in zip(top_indices[0], similarities[0]):
+            if similarity > self.concept_threshold:
                 relevant_concepts.append({
                     'content': self.knowledge_base['all_segments'][idx],
-                    'source': 'lecture' if idx < len(self.knowledge_base['lecture']['segments']) else 'textbook',
-                    'similarity': float(similarities[idx])
+                    'source': self.knowledge_base['sources'][idx],
+                    'similarity': float(similarity)
                 })
         
         return {
@@ -73,51 +126,64 @@ class EducationalAnalyzer:
             'main_topic': relevant_concepts[0]['content'] if relevant_concepts else None
         }
     
-    def evaluate_answers(self, question_analysis, student_answers):
+    def evaluate_answers(self, question_analysis, student_answers, batch_size=64):
         """Assess student answers against question requirements"""
-        results = []
         expected_concepts = [c['content'] for c in question_analysis['relevant_concepts']]
-        expected_embeddings = self.model.encode(expected_concepts)
+        if not student_answers:
+            return []
         
-        for answer in student_answers:
-            answer_embedding = self.model.encode(self.preprocess(answer))
-            
-            # Compare with expected concepts
-            concept_similarities = cosine_similarity(
-                [answer_embedding], 
-                expected_embeddings
-            )[0]
-            
-            # Compare with full knowledge base
-            knowledge_similarities = cosine_similarity(
-                [answer_embedding],
-                self.knowledge_base['combined_embeddings']
-            )
-            best_knowledge_match = np.argmax(knowledge_similarities)
-            knowledge_score = knowledge_similarities[0][best_knowledge_match]
-            
-            # Calculate coverage of expected concepts
-            covered_concepts = []
-            for i, sim in enumerate(concept_similarities):
-                if sim > self.concept_threshold:
-                    covered_concepts.append({
-                        'concept': expected_concepts[i],
-                        'similarity': float(sim)
-                    })
+        # Encode every answer (and the expected concepts) in one call each,
+        # normalized once so cosine similarity is a plain matrix product
+        answer_embeddings = self._normalize(self.model.encode(
+            [self.preprocess(answer) for answer in student_answers],
+            batch_size=batch_size,
+            convert_to_numpy=True
+        ))
+        if expected_concepts:
+            expected_embeddings = self._normalize(self.model.encode(expected_concepts, convert_to_numpy=True))
+        else:
+            expected_embeddings = np.zeros((0, answer_embeddings.shape[1]), dtype=np.float32)
+        
+        # answers x concepts similarities, best knowledge-base match per answer
+        concept_similarities = answer_embeddings @ expected_embeddings.T
+        best_knowledge_matches, knowledge_scores = self.knowledge_base['index'].search(answer_embeddings, 1)
+        best_knowledge_matches = best_knowledge_matches[:, 0]
+        knowledge_scores = knowledge_scores[:, 0]
+        
+        # Coverage of expected concepts
+        covered = concept_similarities > self.concept_threshold
+        covered_counts = covered.sum(axis=1)
+        
+        results = []
+        for i, answer in enumerate(student_answers):
+            covered_concepts = [
+                {
+                    'concept': expected_concepts[j],
+                    'similarity': float(concept_similarities[i, j])
+                }
+                for j in np.flatnonzero(covered[i])
+            ]
             
             results.append({
                 'answer': answer,
                 'covered_concepts': covered_concepts,
-                'coverage_score': len(covered_concepts) / len(expected_concepts) if expected_concepts else 0,
+                'coverage_score': float(covered_counts[i] / len(expected_concepts)) if expected_concepts else 0,
                 'knowledge_alignment': {
-                    'best_match': self.knowledge_base['all_segments'][best_knowledge_match],
-                    'score': float(knowledge_score)
+                    'best_match': self.knowledge_base['all_segments'][best_knowledge_matches[i]],
+                    'score': float(knowledge_scores[i])
                 },
-                'needs_review': len(covered_concepts) < len(expected_concepts) / 2  # If <50% covered
+                'needs_review': bool(covered_counts[i] < len(expected_concepts) / 2)  # If <50% covered
             })
         
         return results
     
+    @staticmethod
+    def _normalize(embeddings):
+        """Row-normalize to unit length (zero rows stay zero)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+    
     def generate_insights(self, question_analysis, answer_evaluations):
         """Generate teacher dashboard data"""
         concept_performance = {}
@@ -172,66 +238,103 @@ class EducationalAnalyzer:
         
         return insights
 
-# Example Usage
-analyzer = EducationalAnalyzer()
+_shared_analyzer = None
+_shared_lock = threading.Lock()
 
-# 1. Build knowledge base (from lecture audio and textbook PDF)
-lecture_content = """
+
+def get_analyzer():
+    """Process-wide analyzer whose model is shared across requests"""
+    global _shared_analyzer
+    if _shared_analyzer is None:
+        with _shared_lock:
+            if _shared_analyzer is None:
+                _shared_analyzer = EducationalAnalyzer()
+    return _shared_analyzer
+
+
+# Example content for the command-line demo
+EXAMPLE_LECTURE = """
 Photosynthesis converts light energy to chemical energy. 
 This process occurs in chloroplasts containing chlorophyll. 
 The light-dependent reactions produce ATP and NADPH.
 """
 
-textbook_content = """
+EXAMPLE_TEXTBOOK = """
 Plants synthesize glucose through photosynthesis using sunlight. 
 Chloroplast organelles contain chlorophyll pigments. 
 The first stage (light reactions) generates energy carriers ATP and NADPH.
 """
 
-analyzer.build_knowledge_base(lecture_content, textbook_content)
-
-# 2. Analyze a question
-question = "How do plants convert sunlight into usable energy?"
-question_analysis = analyzer.analyze_question(question)
-
-print("Question Analysis:")
-print(f"Main Topic: {question_analysis['main_topic']}")
-print("Relevant Concepts:")
-for concept in question_analysis['relevant_concepts']:
-    print(f"- {concept['content'][:50]}... (Similarity: {concept['similarity']:.2f})")
+EXAMPLE_QUESTION = "How do plants convert sunlight into usable energy?"
 
-# 3. Evaluate student answers
-student_answers = [
+EXAMPLE_ANSWERS = [
     "Plants use photosynthesis in chloroplasts to make energy from light",
     "Chlorophyll captures sunlight",
     "Through some process involving leaves"
 ]
 
-evaluations = analyzer.evaluate_answers(question_analysis, student_answers)
-
-print("\nAnswer Evaluations:")
-for eval in evaluations:
-    print(f"\nAnswer: {eval['answer']}")
-    print(f"Coverage: {eval['coverage_score']:.1%}")
-    print(f"Best Knowledge Match: {eval['knowledge_alignment']['best_match'][:50]}...")
-    print(f"Needs Review: {'Yes' if eval['needs_review'] else 'No'}")
-
-# 4. Generate teacher insights
-insights = analyzer.generate_insights(question_analysis, evaluations)
-
-print("\nClass Insights:")
-print(f"Overall Coverage: {insights['class_coverage']:.1f}%\n")
-
-print("🔍 Topic-Wise Performance:")
-for cp in insights['concept_performance']:
-    print(f"- {cp['concept'][:60]}...")
-    print(f"  - Coverage: {cp['coverage_percentage']:.1f}%")
-    print(f"  - Avg Similarity: {cp['average_similarity']:.2f}")
-    print()
-
-if insights['problem_areas']:
-    print("⚠️  Topics Needing Review:")
-    for concept in insights['problem_areas']:
-        print(f"- {concept[:60]}...")
-else:
-    print("✅ No significant problem areas detected.")
+
+def main(argv=None):
+    """Analyze one question and a set of answers against lecture/textbook text"""
+    parser = argparse.ArgumentParser(description="Semantic answer analysis demo")
+    parser.add_argument("--lecture", help="Lecture transcription file (defaults to an example)")
+    parser.add_argument("--textbook", help="Textbook content file (defaults to an example)")
+    parser.add_argument("--question", default=EXAMPLE_QUESTION)
+    parser.add_argument("--answers", nargs="+", default=EXAMPLE_ANSWERS)
+    args = parser.parse_args(argv)
+
+    def read(path, default):
+        if not path:
+            return default
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    analyzer = get_analyzer()
+
+    # 1. Build knowledge base (from lecture audio and textbook PDF)
+    analyzer.build_knowledge_base(read(args.lecture, EXAMPLE_LECTURE), read(args.textbook, EXAMPLE_TEXTBOOK))
+    question = args.question
+    student_answers = args.answers
+
+    # 2. Analyze a question
+    question_analysis = analyzer.analyze_question(question)
+
+    print("Question Analysis:")
+    print(f"Main Topic: {question_analysis['main_topic']}")
+    print("Relevant Concepts:")
+    for concept in question_analysis['relevant_concepts']:
+        print(f"- {concept['content'][:50]}... (Similarity: {concept['similarity']:.2f})")
+
+    # 3. Evaluate student answers
+    evaluations = analyzer.evaluate_answers(question_analysis, student_answers)
+
+    print("\nAnswer Evaluations:")
+    for eval in evaluations:
+        print(f"\nAnswer: {eval['answer']}")
+        print(f"Coverage: {eval['coverage_score']:.1%}")
+        print(f"Best Knowledge Match: {eval['knowledge_alignment']['best_match'][:50]}...")
+        print(f"Needs Review: {'Yes' if eval['needs_review'] else 'No'}")
+
+    # 4. Generate teacher insights
+    insights = analyzer.generate_insights(question_analysis, evaluations)
+
+    print("\nClass Insights:")
+    print(f"Overall Coverage: {insights['class_coverage']:.1f}%\n")
+
+    print("🔍 Topic-Wise Performance:")
+    for cp in insights['concept_performance']:
+        print(f"- {cp['concept'][:60]}...")
+        print(f"  - Coverage: {cp['coverage_percentage']:.1f}%")
+        print(f"  - Avg Similarity: {cp['average_similarity']:.2f}")
+        print()
+
+    if insights['problem_areas']:
+        print("⚠️  Topics Needing Review:")
+        for concept in insights['problem_areas']:
+            print(f"- {concept[:60]}...")
+    else:
+        print("✅ No significant problem areas detected.")
+
+
+if __name__ == "__main__":
+    main()
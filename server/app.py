@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, stream_with_context, make_response
 import socket
 import os
 from werkzeug.utils import secure_filename
@@ -7,9 +7,18 @@ import question_gen
 import utils
 import json
 import slm_analyse
+import models
+from jobs import JobManager
+from submit_queue import SubmissionQueue
+from published_test import PublishedTest
+from metrics import RequestMetrics
 
 app = Flask(__name__)
 
+# Per-endpoint request latency, reported at /metrics
+request_metrics = RequestMetrics()
+request_metrics.init_app(app)
+
 # Get the directory where app.py is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -20,6 +29,46 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 # Define file paths
 PUBLISHED_TEST_FILE = os.path.join(BASE_DIR, "published_test.json")
 
+# Cached published test, reloaded only when it changes
+published_test = PublishedTest(PUBLISHED_TEST_FILE)
+
+# Background ingestion jobs (one at a time, the models are shared)
+job_manager = JobManager(workers=1)
+
+# Batched writer for /submit
+submission_queue = SubmissionQueue()
+
+
+def run_ingestion(audio_path, pdf_path, status_callback=None):
+    """Transcribe audio and extract PDF content, returning the outputs"""
+    audio_output, pdf_output = process_files(
+        audio_path,
+        pdf_path,
+        status_callback=status_callback
+    )
+
+    # Read the output files' content
+    audio_text = ""
+    pdf_text = ""
+    try:
+        with open(audio_output, "r", encoding="utf-8") as f:
+            audio_text = f.read()
+    except Exception:
+        audio_text = "Could not read audio transcription output."
+
+    try:
+        with open(pdf_output, "r", encoding="utf-8") as f:
+            pdf_text = f.read()
+    except Exception:
+        pdf_text = "Could not read PDF extraction output."
+
+    return {
+        'audio_output': audio_output,
+        'pdf_output': pdf_output,
+        'audio_text': audio_text,
+        'pdf_text': pdf_text
+    }
+
 # Combined Admin Dashboard
 @app.route("/admin", methods=["GET", "POST"])
 def admin():
@@ -34,53 +83,33 @@ def admin():
                 pdf_filename = secure_filename(pdf.filename)
                 audio_filename = secure_filename(audio.filename)
                 
-                pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], pdf_filename)
-                audio_path = os.path.join(app.config['UPLOAD_FOLDER'], audio_filename)
+                # One folder per job, so a later upload with the same name
+                # cannot overwrite files a queued job has yet to read
+                job_id = job_manager.new_id()
+                job_dir = os.path.join(app.config['UPLOAD_FOLDER'], job_id)
+                os.makedirs(job_dir, exist_ok=True)
+                pdf_path = os.path.join(job_dir, pdf_filename)
+                audio_path = os.path.join(job_dir, audio_filename)
                 
                 pdf.save(pdf_path)
                 audio.save(audio_path)
                 
-                try:
-                    # Process files in parallel
-                    updates = []
-                    def status_callback(update):
-                        updates.append(update)
-                    
-                    audio_output, pdf_output = process_files(
-                        audio_path,
-                        pdf_path,
-                        status_callback=status_callback
-                    )
-
-                    # Read the output files' content
-                    audio_text = ""
-                    pdf_text = ""
-                    try:
-                        with open(audio_output, "r", encoding="utf-8") as f:
-                            audio_text = f.read()
-                    except Exception:
-                        audio_text = "Could not read audio transcription output."
-
-                    try:
-                        with open(pdf_output, "r", encoding="utf-8") as f:
-                            pdf_text = f.read()
-                    except Exception:
-                        pdf_text = "Could not read PDF extraction output."
-
-                    return jsonify({
-                        'success': True,
-                        'message': 'Files processed successfully',
-                        'updates': updates,
-                        'audio_output': audio_output,
-                        'pdf_output': pdf_output,
-                        'audio_text': audio_text,
-                        'pdf_text': pdf_text
-                    })
-                except Exception as e:
-                    return jsonify({
-                        'success': False,
-                        'message': f'Error processing files: {str(e)}'
-                    })
+                # Queue processing in the background and return immediately
+                job = job_manager.submit(
+                    run_ingestion,
+                    audio_path,
+                    pdf_path,
+                    description=f"{audio_filename} + {pdf_filename}",
+                    job_id=job_id
+                )
+                return jsonify({
+                    'success': True,
+                    'message': 'Files uploaded, processing started',
+                    'job_id': job.id,
+                    'queue_position': job_manager.position(job),
+                    'status_url': url_for('job_status', job_id=job.id),
+                    'events_url': url_for('job_events', job_id=job.id)
+                })
         
         # Handle question submission
         question = request.form.get("question")
@@ -95,14 +124,43 @@ def admin():
     student_data = utils.load_student_analysis()
     return render_template("admin.html", questions=questions, data=student_data)
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown job'}), 404
+    data = job.to_dict(include_updates=request.args.get("updates") == "1")
+    data['success'] = True
+    return jsonify(data)
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown job'}), 404
+    # Resume from the last event the browser saw after a reconnect
+    start = int(request.headers.get("Last-Event-ID", 0) or 0)
+    return Response(
+        stream_with_context(job.events(start=start)),
+        mimetype="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({"pid": os.getpid(), "endpoints": request_metrics.summary()})
+
 # Student Test Page
 @app.route("/test")
 def test():
-    questions = []
-    if os.path.exists(PUBLISHED_TEST_FILE):
-        with open(PUBLISHED_TEST_FILE, "r", encoding="utf-8") as f:
-            questions = json.load(f)
-    return render_template("test.html", questions=questions)
+    # Rendered once per published test; browsers revalidate with the ETag
+    html, etag = published_test.render(
+        lambda questions: render_template("test.html", questions=questions)
+    )
+    response = make_response(html)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
 # Submit Test
 @app.route("/submit", methods=["POST"])
@@ -112,36 +170,53 @@ def submit():
     name = data.get("name")
     
     # Get questions from published test
-    questions = []
-    if os.path.exists(PUBLISHED_TEST_FILE):
-        with open(PUBLISHED_TEST_FILE, "r", encoding="utf-8") as f:
-            questions = json.load(f)
-    
-    # Save the submission
-    utils.save_test_submission(name, questions, answers)
+    questions = list(published_test.load())
     
-    # Calculate and save result
+    # Score now, persist in the background with other pending submissions
     result = utils.evaluate(answers)
-    if name:
-        utils.save_student_result(name, result["score"], result["total"])
+    submission_queue.submit(name, questions, answers, result)
     return jsonify(result)
 
 @app.route("/generate_questions", methods=["POST"])
 def generate_questions():
     try:
         para1, para2 = question_gen.read_paragraphs()
-        questions = question_gen.generate_questions(para1, para2)
+        # mode=topic makes one small call per shared topic instead of one big one
+        if request.values.get("mode") == "topic":
+            questions = question_gen.generate_questions_by_topic(para1, para2)
+        else:
+            questions = question_gen.generate_questions(para1, para2)
         return jsonify({"success": True, "questions": questions})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
 
+@app.route("/generate_questions/stream", methods=["GET"])
+def generate_questions_stream():
+    """Stream the model's reply as Server-Sent Events while it is generated"""
+    def events():
+        text = ""
+        try:
+            para1, para2 = question_gen.read_paragraphs()
+            for chunk in question_gen.stream_questions(para1, para2):
+                text += chunk
+                yield f"data: {json.dumps({'chunk': chunk})}\n\n"
+            questions = question_gen.split_questions(text)
+            yield f"event: done\ndata: {json.dumps({'success': True, 'questions': questions})}\n\n"
+        except Exception as e:
+            yield f"event: done\ndata: {json.dumps({'success': False, 'message': str(e)})}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route("/publish_test", methods=["POST"])
 def publish_test():
     try:
         para1, para2 = question_gen.read_paragraphs()
         questions = question_gen.generate_questions(para1, para2)
-        with open(PUBLISHED_TEST_FILE, "w", encoding="utf-8") as f:
-            json.dump(questions, f)
+        published_test.publish(questions)
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
@@ -149,23 +224,25 @@ def publish_test():
 @app.route("/analyse", methods=["GET"])
 def analyse():
     try:
-        # Get AI analysis
-        analysis_result = slm_analyse.get_analysis()
-        
-        if not analysis_result["success"]:
-            return render_template("analysis.html", error=analysis_result["error"])
+        # Make sure just-submitted tests are included
+        submission_queue.flush()
+
+        # Cached AI analysis; regenerated in the background when inputs change
+        state = slm_analyse.get_cached_analysis()
         
-        # Read the test submissions for display
-        submissions = []
-        if os.path.exists(utils.TEST_SUBMISSIONS_FILE):
-            with open(utils.TEST_SUBMISSIONS_FILE, "r", encoding="utf-8") as f:
-                submissions = json.load(f)
+        if state["error"] and not state["analysis"] and not state["refreshing"]:
+            return render_template("analysis.html", error=state["error"])
         
         # Format the data for display
+        submissions = state["submissions"]
         analysis_data = {
             "total_submissions": len(submissions),
             "submissions": submissions,
-            "ai_analysis": analysis_result["analysis"]
+            "ai_analysis": state["analysis"],
+            "stale": state["stale"],
+            "refreshing": state["refreshing"],
+            "generated_at": state["generated_at"],
+            "error": state["error"]
         }
         
         return render_template("analysis.html", data=analysis_data)
@@ -175,4 +252,8 @@ def analyse():
 if __name__ == "__main__":
     ip = socket.gethostbyname(socket.gethostname())
     print(f"Server running at http://{ip}:5000")
+    # Load Whisper, Nougat and BLIP in the background so the first upload is fast.
+    # Only in the reloader's serving child: the watcher parent never uses them
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        models.warm_up()
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import base64
+import shutil
+import threading
+
+# Bump when the stored layout or extraction output format changes
+CACHE_VERSION = 2
+
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-256 of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode(value):
+    # Page images are stored as PNG bytes, which JSON cannot hold directly
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, tuple):
+        return list(value)
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def _decode(obj):
+    if "__bytes__" in obj and len(obj) == 1:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+
+class IngestionCache:
+    """
+    Content-addressed store for extraction results
+
+    Entries are keyed on the uploaded file's bytes plus the model/config
+    settings that produced them, so renamed re-uploads hit the cache and a
+    config change misses it. Each entry holds the final markdown and the
+    per-page/per-chunk results, so an interrupted run can resume.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def key_for(self, path, kind, settings=None):
+        """Cache key for a file processed as `kind` ("audio" or "pdf") with `settings`"""
+        payload = json.dumps({
+            "version": CACHE_VERSION,
+            "kind": kind,
+            "file": file_digest(path),
+            "settings": settings or {}
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _parts_dir(self, key):
+        return os.path.join(self._entry_dir(key), "parts")
+
+    def _final_path(self, key):
+        return os.path.join(self._entry_dir(key), "result.md")
+
+    def has_final(self, key):
+        return os.path.exists(self._final_path(key))
+
+    def copy_final(self, key, output_path):
+        """Copy the cached markdown to output_path, returns False on a miss"""
+        if not self.has_final(key):
+            return False
+        shutil.copyfile(self._final_path(key), output_path)
+        return True
+
+    def save_final(self, key, markdown_path):
+        os.makedirs(self._entry_dir(key), exist_ok=True)
+        tmp_path = self._final_path(key) + ".tmp"
+        shutil.copyfile(markdown_path, tmp_path)
+        os.replace(tmp_path, self._final_path(key))
+
+    def save_part(self, key, index, data):
+        """Store one page/chunk result; written atomically so a crash never leaves half a file"""
+        parts_dir = self._parts_dir(key)
+        os.makedirs(parts_dir, exist_ok=True)
+        part_path = os.path.join(parts_dir, f"{index}.json")
+        tmp_path = part_path + f".{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=_encode)
+        os.replace(tmp_path, part_path)
+
+    def load_parts(self, key):
+        """All stored parts for an entry as {index: data}"""
+        parts_dir = self._parts_dir(key)
+        parts = {}
+        if not os.path.isdir(parts_dir):
+            return parts
+        for name in os.listdir(parts_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(parts_dir, name), "r", encoding="utf-8") as f:
+                    parts[int(name[:-5])] = json.load(f, object_hook=_decode)
+            except (ValueError, OSError):
+                continue  # Skip unreadable parts, they are recomputed
+        return parts
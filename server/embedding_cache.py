@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    On-disk embedding cache keyed by segment-text hash, one store per model
+
+    Vectors live in a fixed-capacity memory-mapped .npy file, so only the rows
+    that are actually looked up get paged in; a small JSON index maps text
+    hashes to rows. When the store is full the least recently used rows are
+    reused. Re-ingesting a corrected PDF only embeds the segments that changed,
+    and restarts reuse everything already embedded.
+
+    The index is rewritten when entries are added; LRU recency from cache
+    hits alone is persisted every `touch_flush` lookups.
+    """
+
+    def __init__(self, root, model_name, capacity=20000, touch_flush=100):
+        self.dir = os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.vectors_path = os.path.join(self.dir, "vectors.npy")
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.vectors = None
+        self.entries = None  # hash -> [row, last_used]
+        self.clock = 0
+        self.dirty = False
+        self.touch_flush = touch_flush
+        self.touches = 0  # Lookups since recency was last saved
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _load(self, dim=None):
+        """Open the index and memory map on first use"""
+        if self.entries is None:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                self.entries = index["entries"]
+                self.clock = index["clock"]
+                self.capacity = index["capacity"]
+            except (FileNotFoundError, ValueError, KeyError):
+                self.entries = {}
+            if self.entries and os.path.exists(self.vectors_path):
+                self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+            else:
+                self.entries = {}
+        if self.vectors is None and dim is not None:
+            os.makedirs(self.dir, exist_ok=True)
+            self.vectors = np.lib.format.open_memmap(
+                self.vectors_path, mode="w+", dtype=np.float32, shape=(self.capacity, dim)
+            )
+
+    def _free_rows(self, count, protected):
+        """Rows for new entries: unused ones first, then least recently used"""
+        used = {row for row, _ in self.entries.values()}
+        free = [row for row in range(self.capacity) if row not in used][:count]
+        if len(free) < count:
+            # Never evict rows that the current lookup still has to read
+            candidates = [item for item in self.entries.items() if item[0] not in protected]
+            oldest = sorted(candidates, key=lambda item: item[1][1])[:count - len(free)]
+            for text_key, (row, _) in oldest:
+                del self.entries[text_key]
+                free.append(row)
+        return free
+
+    def _save_index(self):
+        if not self.dirty:
+            return
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"capacity": self.capacity, "clock": self.clock, "entries": self.entries}, f)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+        self.touches = 0
+
+    def encode(self, texts, encode_fn):
+        """
+        Embeddings for texts as a contiguous float32 array
+
+        Args:
+            texts (list): Segments to embed
+            encode_fn (callable): Embeds a list of texts; called once, only
+                for segments missing from the store
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        keys = [self.key(text) for text in texts]
+        # One lock around lookup, encode and store so a concurrent call can
+        # never evict rows this call is about to read
+        with self.lock:
+            self._load()
+            missing = list(dict.fromkeys(k for k in keys if k not in self.entries))
+
+            new_vectors = {}
+            if missing:
+                by_key = {k: text for k, text in zip(keys, texts)}
+                encoded = np.asarray(encode_fn([by_key[k] for k in missing]), dtype=np.float32)
+                new_vectors = dict(zip(missing, encoded))
+
+                self._load(dim=encoded.shape[1])
+                rows = self._free_rows(len(missing), protected=set(keys))
+                for text_key, row in zip(missing, rows):
+                    self.vectors[row] = new_vectors[text_key]
+                    self.entries[text_key] = [row, self.clock]
+                self.vectors.flush()
+                self.dirty = True
+
+            result = np.empty((len(keys), self.vectors.shape[1]), dtype=np.float32)
+            self.clock += 1
+            for i, text_key in enumerate(keys):
+                if text_key in new_vectors:
+                    result[i] = new_vectors[text_key]
+                else:
+                    result[i] = self.vectors[self.entries[text_key][0]]
+                if text_key in self.entries:
+                    self.entries[text_key][1] = self.clock
+            self.touches += 1
+            if self.touches >= self.touch_flush:
+                self.dirty = True
+            self._save_index()
+        return result
@@ -0,0 +1,241 @@
+import threading
+import os
+import queue
+import uuid
+import json
+import time
+from collections import OrderedDict
+import utils
+
+
+class Job:
+    """
+    A queued unit of background work with its status updates
+
+    State is kept in memory for the process running the job and written
+    through to SQLite, so any server worker can report it (see StoredJob).
+    """
+
+    def __init__(self, job_id, description=""):
+        self.id = job_id
+        self.description = description
+        self.status = "queued"
+        self.updates = []
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.condition = threading.Condition()
+        utils.save_job(self.id, self.description, self.status, self.created)
+
+    @property
+    def finished(self):
+        return self.status in ("completed", "failed")
+
+    def add_update(self, update):
+        """Status callback handed to the job function"""
+        with self.condition:
+            # Stored under the lock so update numbers reach SQLite in order
+            utils.add_job_update(self.id, len(self.updates), update)
+            self.updates.append(update)
+            self.condition.notify_all()
+
+    def _set_status(self, status, result=None, error=None):
+        with self.condition:
+            utils.update_job_status(self.id, status, result, error)
+            self.status = status
+            self.result = result
+            self.error = error
+            self.condition.notify_all()
+
+    def to_dict(self, include_updates=False):
+        data = {
+            "job_id": self.id,
+            "description": self.description,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "update_count": len(self.updates)
+        }
+        if include_updates:
+            data["updates"] = list(self.updates)
+        return data
+
+    def events(self, start=0, keepalive=15):
+        """
+        Yield Server-Sent-Events for every update from index `start`
+
+        Ends with a "done" event carrying the final job state. A comment line
+        is sent every `keepalive` seconds so proxies keep the stream open.
+        """
+        index = start
+        while True:
+            with self.condition:
+                if index >= len(self.updates) and not self.finished:
+                    self.condition.wait(timeout=keepalive)
+                pending = self.updates[index:]
+                finished = self.finished
+            for update in pending:
+                index += 1
+                yield f"id: {index}\ndata: {json.dumps(update)}\n\n"
+            if finished and index >= len(self.updates):
+                yield f"event: done\ndata: {json.dumps(self.to_dict())}\n\n"
+                return
+            if not pending:
+                yield ": keepalive\n\n"
+
+
+def _owner_alive(pid):
+    """Whether the process that ran a stored job still exists"""
+    if os.name == "nt":
+        # waitress serves from a single process: another pid is a previous run
+        return pid == os.getpid()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class StoredJob:
+    """
+    Read-only view of a job run by another server process, from SQLite
+
+    An unfinished job whose process has exited (a restart or a recycled
+    worker) is reported as failed.
+    """
+
+    def __init__(self, row, poll_interval=0.5):
+        self.id = row["id"]
+        self.row = row
+        self.poll_interval = poll_interval
+
+    @classmethod
+    def load(cls, job_id):
+        row = utils.load_job(job_id)
+        return cls(row) if row else None
+
+    def _refresh(self):
+        row = utils.load_job(self.id) or self.row
+        if row["status"] in ("queued", "running") and not _owner_alive(row["pid"]):
+            row = dict(row, status="failed", error="The server stopped before the job finished")
+        self.row = row
+
+    @property
+    def finished(self):
+        return self.row["status"] in ("completed", "failed")
+
+    def to_dict(self, include_updates=False):
+        self._refresh()
+        data = {
+            "job_id": self.id,
+            "description": self.row["description"],
+            "status": self.row["status"],
+            "result": self.row["result"],
+            "error": self.row["error"],
+            "update_count": self.row["update_count"]
+        }
+        if include_updates:
+            data["updates"] = utils.load_job_updates(self.id)
+        return data
+
+    def events(self, start=0, keepalive=15):
+        """Same stream as Job.events, polling SQLite for new updates"""
+        index = start
+        last_sent = time.monotonic()
+        while True:
+            self._refresh()
+            finished = self.finished
+            pending = utils.load_job_updates(self.id, index)
+            for update in pending:
+                index += 1
+                yield f"id: {index}\ndata: {json.dumps(update)}\n\n"
+            if pending:
+                last_sent = time.monotonic()
+            if finished:
+                yield f"event: done\ndata: {json.dumps(self.to_dict())}\n\n"
+                return
+            if time.monotonic() - last_sent >= keepalive:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            time.sleep(self.poll_interval)
+
+
+class JobManager:
+    """Runs submitted jobs on a small pool of background worker threads"""
+
+    def __init__(self, workers=1, max_finished=50):
+        self.jobs = OrderedDict()
+        self.max_finished = max_finished
+        self.workers = workers
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def _ensure_workers(self):
+        # Started lazily, and again after a fork: threads do not survive
+        # into worker processes when the app is preloaded
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                for _ in range(self.workers):
+                    threading.Thread(target=self._worker, daemon=True).start()
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    def submit(self, fn, *args, description="", job_id=None):
+        """
+        Queue fn(*args, status_callback=...) to run in the background
+
+        Args:
+            job_id (str): Id from new_id(), when the caller needs it before
+                the job is queued (e.g. to name its upload files)
+
+        Returns:
+            Job: The queued job; its id can be polled or streamed
+        """
+        self._ensure_workers()
+        job = Job(job_id or self.new_id(), description)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._prune()
+        self.pending.put((job, fn, args))
+        return job
+
+    def get(self, job_id):
+        """The job if this process runs it, else its stored state, else None"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        return job or StoredJob.load(job_id)
+
+    def position(self, job):
+        """Number of queued jobs ahead of this one"""
+        with self.lock:
+            queued = [j for j in self.jobs.values() if j.status == "queued"]
+        return queued.index(job) if job in queued else 0
+
+    def _prune(self):
+        # Keep only the most recent finished jobs
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        expired = finished[:max(0, len(finished) - self.max_finished)]
+        for job_id in expired:
+            del self.jobs[job_id]
+        if expired:
+            utils.delete_jobs(expired)
+
+    def _worker(self):
+        while True:
+            job, fn, args = self.pending.get()
+            job._set_status("running")
+            try:
+                result = fn(*args, status_callback=job.add_update)
+                job._set_status("completed", result=result)
+            except Exception as e:
+                job.add_update({
+                    'type': 'status',
+                    'message': f"Error: {str(e)}"
+                })
+                job._set_status("failed", error=str(e))
@@ -0,0 +1,118 @@
+# Shared client for the local AnythingLLM chat API (model used: phi3.5)
+
+import json
+import os
+import threading
+import requests
+import yaml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml")
+
+
+def load_config():
+    with open(CONFIG_FILE, "r") as f:
+        return yaml.safe_load(f)
+
+
+class LLMClient:
+    """
+    Pooled, retrying client for the workspace chat endpoints
+
+    One requests.Session is shared by every caller, so connections to the
+    local server are reused. With `stream: true` in config.yaml, replies are
+    read from the stream-chat endpoint and can be consumed token by token.
+    """
+
+    def __init__(self, config=None):
+        config = config or load_config()
+        self.api_key = config["api_key"]
+        base_url = config["model_server_base_url"]
+        workspace_slug = config["workspace_slug"]
+        self.chat_url = f"{base_url}/workspace/{workspace_slug}/chat"
+        self.stream_url = f"{base_url}/workspace/{workspace_slug}/stream-chat"
+        self.stream = config.get("stream", False)
+        self.connect_timeout = config.get("connect_timeout", 5)
+        # Max wait between streamed chunks, and for a whole non-streamed reply
+        self.stream_timeout = config.get("stream_timeout", 60)
+        self.request_timeout = config.get("request_timeout", 300)
+
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=0,  # A read timeout means the model is still busy; don't resubmit
+            status=2,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=frozenset(["POST"]),
+            backoff_factor=0.5
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        })
+
+    def _payload(self, message, session_id, mode):
+        return {
+            "message": message,
+            "mode": mode,
+            "sessionId": session_id,
+            "attachments": [],
+            "reset": False
+        }
+
+    def chat(self, message, session_id, mode="chat"):
+        """Full reply text, streamed under the hood when enabled"""
+        if self.stream:
+            return "".join(self.stream_chat(message, session_id, mode))
+
+        response = self.session.post(
+            self.chat_url,
+            json=self._payload(message, session_id, mode),
+            timeout=(self.connect_timeout, self.request_timeout)
+        )
+        response.raise_for_status()
+        data = response.json()
+        if data.get("error"):
+            raise RuntimeError(data["error"])
+        return data.get("textResponse") or ""
+
+    def stream_chat(self, message, session_id, mode="chat"):
+        """Yield reply text chunks as the server generates them"""
+        with self.session.post(
+            self.stream_url,
+            json=self._payload(message, session_id, mode),
+            timeout=(self.connect_timeout, self.stream_timeout),
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                # Server-Sent-Events: "data: {...}" lines
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):].strip())
+                if event.get("error"):
+                    raise RuntimeError(event["error"])
+                chunk = event.get("textResponse")
+                if chunk:
+                    yield chunk
+                if event.get("close"):
+                    break
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide shared client"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
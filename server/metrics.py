@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import defaultdict, deque
+
+
+class RequestMetrics:
+    """Rolling per-endpoint request latency, kept per process"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        """Time every request and add an X-Response-Time header"""
+        from flask import g, request
+
+        @app.before_request
+        def _start_timer():
+            g.request_start = time.perf_counter()
+
+        @app.after_request
+        def _record_latency(response):
+            start = g.get("request_start")
+            if start is not None:
+                elapsed = time.perf_counter() - start
+                self.record(request.url_rule.rule if request.url_rule else request.path, elapsed)
+                response.headers["X-Response-Time"] = f"{elapsed * 1000:.1f}ms"
+            return response
+
+    def record(self, endpoint, seconds):
+        with self.lock:
+            self.samples[endpoint].append(seconds)
+            self.counts[endpoint] += 1
+
+    def summary(self):
+        """Request count and p50/p95/p99/max latency (ms) per endpoint"""
+        with self.lock:
+            snapshot = {endpoint: sorted(samples) for endpoint, samples in self.samples.items()}
+            counts = dict(self.counts)
+
+        def percentile(values, p):
+            return values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000
+
+        return {
+            endpoint: {
+                "count": counts[endpoint],
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": values[-1] * 1000
+            }
+            for endpoint, values in snapshot.items() if values
+        }
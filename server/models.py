@@ -0,0 +1,150 @@
+import threading
+import os
+import yaml
+import torch
+from transformers import (
+    AutoProcessor,
+    AutoModelForSpeechSeq2Seq,
+    AutoModelForImageTextToText,
+    BlipForConditionalGeneration,
+    BlipProcessor
+)
+
+# Device shared by every model in the registry
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml")
+
+_loaders = {}
+_models = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def load_config():
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return {}
+
+
+config = load_config()
+
+
+def quantization_enabled():
+    """Whether config.yaml opts in to int8 inference (CPU only)"""
+    return bool(config.get("quantize_models", False)) and DEVICE == "cpu"
+
+
+def quantize(model):
+    """Dynamic int8 quantization of the linear layers for CPU inference"""
+    return torch.quantization.quantize_dynamic(
+        model,
+        {torch.nn.Linear},
+        dtype=torch.qint8
+    )
+
+
+def register(name):
+    """Register a loader function that returns a (processor, model) pair"""
+    def decorator(loader):
+        _loaders[name] = loader
+        return loader
+    return decorator
+
+
+@register("whisper")
+def _load_whisper():
+    # Processor and model sizes must match
+    processor = AutoProcessor.from_pretrained("openai/whisper-small")
+    model = AutoModelForSpeechSeq2Seq.from_pretrained("openai/whisper-small")
+    model.eval()
+    return processor, model
+
+
+@register("nougat")
+def _load_nougat():
+    # Nougat model for document understanding
+    processor = AutoProcessor.from_pretrained("facebook/nougat-small")
+    model = AutoModelForImageTextToText.from_pretrained("facebook/nougat-small")
+    model.to(DEVICE)
+    model.eval()
+    return processor, model
+
+
+@register("blip")
+def _load_blip():
+    # BLIP base model for image captioning
+    processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
+    model = BlipForConditionalGeneration.from_pretrained(
+        "Salesforce/blip-image-captioning-base",
+        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
+    )
+    model.to(DEVICE)
+    model.eval()
+    return processor, model
+
+
+def get_model(name, quantized=None):
+    """
+    Return the cached (processor, model) pair, loading it on first use
+
+    Args:
+        name (str): Registered model name ("whisper", "nougat" or "blip")
+        quantized (bool): Use the int8 variant, defaults to the config.yaml setting
+    """
+    if name not in _loaders:
+        raise KeyError(f"Unknown model: {name}")
+    if quantized is None:
+        quantized = quantization_enabled()
+    key = (name, bool(quantized))
+    if key in _models:
+        return _models[key]
+
+    # One lock per model so different models can load concurrently
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _models:
+            processor, model = _loaders[name]()
+            if quantized:
+                model = quantize(model)
+            _models[key] = (processor, model)
+    return _models[key]
+
+
+def is_loaded(name, quantized=None):
+    if quantized is None:
+        quantized = quantization_enabled()
+    return (name, bool(quantized)) in _models
+
+
+def warm_up(names=None, background=True):
+    """
+    Load models ahead of their first use
+
+    Args:
+        names (list): Models to load, defaults to every registered model
+        background (bool): Load in a daemon thread instead of blocking
+
+    Returns:
+        threading.Thread or None: The warm-up thread when running in background
+    """
+    names = list(names) if names else list(_loaders)
+
+    def load_all():
+        for name in names:
+            try:
+                get_model(name)
+                print(f"Model ready: {name}")
+            except Exception as e:
+                print(f"Failed to warm up {name}: {str(e)}")
+
+    if not background:
+        load_all()
+        return None
+
+    thread = threading.Thread(target=load_all, daemon=True)
+    thread.start()
+    return thread
@@ -1,68 +1,140 @@
 import torch
-from transformers import (
-    AutoProcessor, 
-    AutoModelForImageTextToText,
-    BlipForConditionalGeneration,
-    BlipProcessor
-)
-from pdf2image import convert_from_path
+import numpy as np
+from scipy import ndimage
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
 import os
 import io
+import subprocess
+import threading
+import queue
 import pytesseract
 from collections import defaultdict
+from models import get_model, DEVICE
+
+# Characters that suggest a page needs Nougat's LaTeX-aware transcription
+MATH_CHARS = set("=+−×÷±∑∏∫√∞≈≠≤≥∂∇πθλμσαβγδΔΩ^_")
+
+class PagePipeline:
+    """Collects per-page results from the stage threads in page order"""
+
+    def __init__(self, total_pages):
+        self.total_pages = total_pages
+        self.results = {}
+        self.error = None
+        self.condition = threading.Condition()
+
+    def put(self, page_num, page_result):
+        with self.condition:
+            self.results[page_num] = page_result
+            self.condition.notify_all()
+
+    def fail(self, error):
+        with self.condition:
+            if self.error is None:
+                self.error = error
+            self.condition.notify_all()
+
+    def result(self, page_num):
+        """Block until the given page is done, then hand it over"""
+        with self.condition:
+            while page_num not in self.results and self.error is None:
+                self.condition.wait()
+            if page_num not in self.results:
+                raise self.error
+            return self.results.pop(page_num)
 
 class PDFTextImageExtractor:
-    def __init__(self):
-        # Initialize Nougat model for document understanding (keep same)
-        self.nougat_processor = AutoProcessor.from_pretrained("facebook/nougat-small")
-        self.nougat_model = AutoModelForImageTextToText.from_pretrained("facebook/nougat-small")
-        
-        # Initialize BLIP base model for image captioning (changed from BLIP-2)
-        self.blip_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-        self.blip_model = BlipForConditionalGeneration.from_pretrained(
-            "Salesforce/blip-image-captioning-base",
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
-        )
-        
-        # Device configuration
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.nougat_model.to(self.device)
-        self.blip_model.to(self.device)
+    def __init__(self, quantized=None, use_text_layer=True, min_text_chars=200, max_math_ratio=0.02,
+                 min_figure_area=0.02):
+        # Nougat (document understanding) and BLIP base (image captioning)
+        # come from the shared registry, so repeat uploads reuse loaded models.
+        # quantized=None follows the quantize_models setting in config.yaml
+        self.nougat_processor, self.nougat_model = get_model("nougat", quantized=quantized)
+        self.blip_processor, self.blip_model = get_model("blip", quantized=quantized)
+        self.device = DEVICE
+
+        # Text-layer fast path: born-digital pages with enough embedded text
+        # and little math skip Nougat entirely
+        self.use_text_layer = use_text_layer
+        self.min_text_chars = min_text_chars
+        self.max_math_ratio = max_math_ratio
+
+        # Smallest region (fraction of the page) treated as a figure
+        self.min_figure_area = min_figure_area
         
         # Configure Tesseract OCR (fallback for pure text pages)
         pytesseract.pytesseract.tesseract_cmd = r'/usr/bin/tesseract'  # Update path as needed
 
-    def extract_full_content(self, pdf_path, output_dir="output", status_callback=None):
-        """Extract all text and image descriptions from PDF"""
+    def extract_full_content(self, pdf_path, output_dir="output", status_callback=None,
+                             text_workers=1, caption_workers=1, queue_size=4, nougat_batch_size=4,
+                             dpi=200, raster_window=8, cached_pages=None, page_callback=None):
+        """
+        Extract all text and image descriptions from PDF
+
+        Pages flow through three overlapping stages - rasterization, text
+        extraction (text layer / Nougat / OCR) and BLIP captioning - each with
+        its own workers, connected by bounded queues so only a few page images
+        are in memory at once. Text workers send up to ``nougat_batch_size``
+        pages through Nougat per generate call. Status callbacks are still
+        sent in page order.
+
+        Pages are rendered lazily ``raster_window`` pages at a time at ``dpi``
+        (Nougat resizes to 896x672, so ~100-150 DPI is enough when OCR is not
+        needed), and each image is released once it has been captioned.
+
+        Pages found in ``cached_pages`` ({page_num: page_result}) are reused
+        as-is; ``page_callback(page_num, page_result)`` is called for every
+        newly processed page so results can be stored as they complete.
+        """
         os.makedirs(output_dir, exist_ok=True)
         
         # Set poppler_path to the local poppler directory
         poppler_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "poppler", "Library", "bin")
-        pages = convert_from_path(pdf_path, poppler_path=poppler_path)
+        total_pages = pdfinfo_from_path(pdf_path, poppler_path=poppler_path)["Pages"]
+        text_layers = self._extract_text_layer(pdf_path, poppler_path) if self.use_text_layer else []
         
         if status_callback:
             status_callback({
                 'type': 'status',
-                'message': f"PDF loaded successfully. Total pages: {len(pages)}"
+                'message': f"PDF loaded successfully. Total pages: {total_pages}"
             })
         
         full_content = {
             'metadata': {
                 'source': os.path.basename(pdf_path),
-                'total_pages': len(pages)
+                'total_pages': total_pages
             },
             'pages': []
         }
 
-        for page_num, page_image in enumerate(pages, start=1):
+        cached_pages = cached_pages or {}
+        page_nums = [n for n in range(1, total_pages + 1) if n not in cached_pages]
+        if cached_pages and status_callback:
+            status_callback({
+                'type': 'status',
+                'message': f"Reusing {total_pages - len(page_nums)} cached pages"
+            })
+
+        pipeline = self._start_pipeline(
+            pdf_path, poppler_path, page_nums, text_layers,
+            text_workers, caption_workers, queue_size, nougat_batch_size,
+            dpi, raster_window
+        )
+
+        for page_num in range(1, total_pages + 1):
             if status_callback:
                 status_callback({
                     'type': 'status',
-                    'message': f"Processing page {page_num}/{len(pages)}..."
+                    'message': f"Processing page {page_num}/{total_pages}..."
                 })
             
-            page_content = self._process_page(page_image, page_num, output_dir)
+            if page_num in cached_pages:
+                page_content = cached_pages[page_num]
+            else:
+                page_content = pipeline.result(page_num)
+                if page_callback:
+                    page_callback(page_num, page_content)
             full_content['pages'].append(page_content)
             
             # Send the actual content for this page
@@ -83,7 +155,7 @@ class PDFTextImageExtractor:
                 
                 status_callback({
                     'type': 'status',
-                    'message': f"Page {page_num} processed - {len(page_content['text'])} chars, {len(page_content['images'])} images"
+                    'message': f"Page {page_num} processed ({page_content['text_source']}) - {len(page_content['text'])} chars, {len(page_content['images'])} images"
                 })
 
         if status_callback:
@@ -94,35 +166,202 @@ class PDFTextImageExtractor:
 
         return full_content
 
-    def _process_page(self, page_image, page_num, output_dir):
-        """Process a single PDF page"""
-        # Save page image temporarily
-        img_path = f"{output_dir}/page_{page_num}.png"
-        page_image.save(img_path, "PNG")
-        
-        page_result = {
+    def _start_pipeline(self, pdf_path, poppler_path, page_nums, text_layers,
+                        text_workers, caption_workers, queue_size, nougat_batch_size=1,
+                        dpi=200, raster_window=1):
+        """Start the rasterize -> text -> caption stage threads for page_nums"""
+        pipeline = PagePipeline(len(page_nums))
+        raster_queue = queue.Queue(maxsize=queue_size)
+        caption_queue = queue.Queue(maxsize=queue_size)
+
+        def rasterize():
+            try:
+                for first_page, last_page in self._raster_windows(page_nums, raster_window):
+                    if pipeline.error is not None:
+                        break
+                    window = convert_from_path(
+                        pdf_path,
+                        dpi=dpi,
+                        first_page=first_page,
+                        last_page=last_page,
+                        poppler_path=poppler_path
+                    )
+                    # Hand pages over one by one so the window can be freed
+                    page_num = first_page
+                    while window:
+                        raster_queue.put((page_num, window.pop(0)))
+                        page_num += 1
+            except Exception as e:
+                pipeline.fail(e)
+            finally:
+                for _ in range(text_workers):
+                    raster_queue.put(None)
+
+        remaining_text_workers = [text_workers]
+        text_lock = threading.Lock()
+
+        # Workers keep draining their queue after a failure so no stage
+        # stays blocked on a full queue
+        def extract_text():
+            try:
+                finished = False
+                while not finished:
+                    # Collect up to nougat_batch_size pages for one batch
+                    batch = []
+                    while len(batch) < nougat_batch_size:
+                        item = raster_queue.get()
+                        if item is None:
+                            finished = True
+                            break
+                        batch.append(item)
+                    if not batch or pipeline.error is not None:
+                        continue
+                    try:
+                        pages = [
+                            (page_num, page_image, text_layers[page_num - 1] if page_num <= len(text_layers) else None)
+                            for page_num, page_image in batch
+                        ]
+                        page_results = self._extract_page_texts(pages)
+                        for (page_num, page_image), page_result in zip(batch, page_results):
+                            caption_queue.put((page_num, page_image, page_result))
+                    except Exception as e:
+                        pipeline.fail(e)
+            finally:
+                # The last text worker to finish shuts down the caption stage
+                with text_lock:
+                    remaining_text_workers[0] -= 1
+                    if remaining_text_workers[0] == 0:
+                        for _ in range(caption_workers):
+                            caption_queue.put(None)
+
+        def caption():
+            while True:
+                item = caption_queue.get()
+                if item is None:
+                    break
+                if pipeline.error is not None:
+                    continue
+                page_num, page_image, page_result = item
+                try:
+                    page_result['images'] = self._extract_and_describe_images(page_image, page_num)
+                    pipeline.put(page_num, page_result)
+                except Exception as e:
+                    pipeline.fail(e)
+                finally:
+                    # Last stage: release the rendered page
+                    page_image.close()
+
+        stages = [rasterize] + [extract_text] * text_workers + [caption] * caption_workers
+        for stage in stages:
+            threading.Thread(target=stage, daemon=True).start()
+        return pipeline
+
+    def _raster_windows(self, page_nums, raster_window):
+        """Group page numbers into runs of consecutive pages, at most raster_window long"""
+        windows = []
+        for page_num in page_nums:
+            if windows and page_num == windows[-1][1] + 1 and page_num - windows[-1][0] < raster_window:
+                windows[-1][1] = page_num
+            else:
+                windows.append([page_num, page_num])
+        return windows
+
+    def _new_page_result(self, page_num):
+        return {
             'page_number': page_num,
             'text': "",
             'images': [],
-            'tables': []
+            'tables': [],
+            'text_source': 'nougat'
         }
 
-        # Try Nougat first for academic content
-        try:
-            page_result['text'] = self._extract_with_nougat(page_image)
-        except Exception as e:
-            print(f"Nougat failed on page {page_num}, using OCR fallback: {str(e)}")
-            page_result['text'] = self._extract_with_ocr(page_image)
+    def _extract_page_text(self, page_image, page_num, text_layer=None):
+        """Text stage: text layer, then Nougat, then OCR fallback"""
+        page_result = self._new_page_result(page_num)
 
-        # Extract and describe images
-        page_result['images'] = self._extract_and_describe_images(page_image, page_num, output_dir)
+        # Use the embedded text when it is good enough, Nougat otherwise
+        if self._use_text_layer(text_layer):
+            page_result['text'] = text_layer.strip()
+            page_result['text_source'] = 'text_layer'
+        else:
+            try:
+                page_result['text'] = self._extract_with_nougat(page_image)
+            except Exception as e:
+                print(f"Nougat failed on page {page_num}, using OCR fallback: {str(e)}")
+                page_result['text'] = self._extract_with_ocr(page_image)
+                page_result['text_source'] = 'ocr'
 
-        os.remove(img_path)
         return page_result
 
+    def _extract_page_texts(self, pages):
+        """
+        Text stage for a batch of (page_num, page_image, text_layer) tuples
+
+        Pages without a usable text layer share one Nougat generate call. If
+        the batch fails, each page is retried on its own with the OCR fallback.
+        """
+        page_results = []
+        nougat_pages = []
+        for page_num, page_image, text_layer in pages:
+            page_result = self._new_page_result(page_num)
+            if self._use_text_layer(text_layer):
+                page_result['text'] = text_layer.strip()
+                page_result['text_source'] = 'text_layer'
+            else:
+                nougat_pages.append((page_num, page_image, page_result))
+            page_results.append(page_result)
+
+        if nougat_pages:
+            try:
+                texts = self._extract_with_nougat_batch([page_image for _, page_image, _ in nougat_pages])
+                for (_, _, page_result), text in zip(nougat_pages, texts):
+                    page_result['text'] = text
+            except Exception as e:
+                page_nums = ", ".join(str(page_num) for page_num, _, _ in nougat_pages)
+                print(f"Batched Nougat failed on pages {page_nums}, retrying page by page: {str(e)}")
+                for page_num, page_image, page_result in nougat_pages:
+                    page_result.update(self._extract_page_text(page_image, page_num))
+
+        return page_results
+
+    def _extract_text_layer(self, pdf_path, poppler_path):
+        """
+        Read the embedded text of every page with poppler's pdftotext
+
+        The default mode is used rather than -layout, which would interleave
+        the lines of two-column pages instead of keeping reading order.
+        """
+        pdftotext = os.path.join(poppler_path, "pdftotext") if os.path.isdir(poppler_path) else "pdftotext"
+        try:
+            result = subprocess.run(
+                [pdftotext, "-enc", "UTF-8", pdf_path, "-"],
+                capture_output=True,
+                check=True
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"No text layer available, using Nougat for all pages: {str(e)}")
+            return []
+
+        # pdftotext separates pages with form feeds
+        return result.stdout.decode("utf-8", errors="replace").split("\f")
+
+    def _use_text_layer(self, text):
+        """Heuristic: enough embedded text and not math-heavy"""
+        if not text:
+            return False
+        stripped = "".join(text.split())
+        if len(stripped) < self.min_text_chars:
+            return False  # Scanned page or mostly figures
+        math_ratio = sum(1 for c in stripped if c in MATH_CHARS) / len(stripped)
+        return math_ratio <= self.max_math_ratio
+
     def _extract_with_nougat(self, page_image):
         """Extract text using Nougat (keep original)"""
-        inputs = self.nougat_processor(images=page_image, return_tensors="pt").to(self.device)
+        return self._extract_with_nougat_batch([page_image])[0]
+
+    def _extract_with_nougat_batch(self, page_images):
+        """Extract text from several pages with a single Nougat generate call"""
+        inputs = self.nougat_processor(images=page_images, return_tensors="pt").to(self.device)
         
         with torch.inference_mode():
             outputs = self.nougat_model.generate(
@@ -131,26 +370,81 @@ class PDFTextImageExtractor:
                 bad_words_ids=[[self.nougat_processor.tokenizer.unk_token_id]]
             )
         
-        return self.nougat_processor.batch_decode(outputs, skip_special_tokens=True)[0]
+        return self.nougat_processor.batch_decode(outputs, skip_special_tokens=True)
 
     def _extract_with_ocr(self, page_image):
         """Fallback OCR extraction"""
         return pytesseract.image_to_string(page_image)
 
-    def _extract_and_describe_images(self, page_image, page_num, output_dir):
-        """Detect and describe images using BLIP base"""
-        img_byte_arr = io.BytesIO()
-        page_image.save(img_byte_arr, format='PNG')
-        img_bytes = img_byte_arr.getvalue()
-        
-        description = self._generate_image_description(page_image)
-        
-        return [{
-            'page': page_num,
-            'description': description,
-            'type': 'diagram' if self._is_diagram(page_image) else 'photograph',
-            'content': img_bytes
-        }]
+    def _extract_and_describe_images(self, page_image, page_num, output_dir=None):
+        """Detect figure regions and describe each crop using BLIP base"""
+        images = []
+        for bbox in self._detect_figures(page_image):
+            figure = page_image.crop(bbox)
+            img_byte_arr = io.BytesIO()
+            figure.save(img_byte_arr, format='PNG')
+            
+            images.append({
+                'page': page_num,
+                'bbox': bbox,
+                'description': self._generate_image_description(figure),
+                'type': 'diagram' if self._is_diagram(figure) else 'photograph',
+                'content': img_byte_arr.getvalue()
+            })
+        return images
+
+    def _detect_figures(self, page_image, max_width=1000, padding=8):
+        """
+        Find figure regions with connected components on a downscaled page
+
+        Text is removed first: undilated ink components no taller than a few
+        glyph heights are letters, words, whole lines or rules, however
+        tightly the lines are spaced. The remaining ink (drawings, plots,
+        photos) is dilated so the parts of a figure merge, and regions that
+        are too small or too thin are dropped. Returns full-resolution
+        (left, top, right, bottom) boxes; text-only pages return [].
+        """
+        scale = min(1.0, max_width / page_image.width)
+        small = page_image.convert("L").resize(
+            (max(1, int(page_image.width * scale)), max(1, int(page_image.height * scale)))
+        )
+        ink = np.asarray(small) < 160
+        if not ink.any():
+            return []
+
+        labels, _ = ndimage.label(ink)
+        regions = ndimage.find_objects(labels)
+        heights = np.array([rows.stop - rows.start for rows, _ in regions])
+        widths = np.array([cols.stop - cols.start for _, cols in regions])
+        # Glyph height from the typical component, capped so a lone figure
+        # (or a page of a few large shapes) is never taken for text
+        text_height = min(3 * np.median(heights), 0.05 * ink.shape[1])
+        # Vertical rules between columns are as thin as a single stroke
+        is_graphic = (heights > text_height) & (widths > 0.01 * ink.shape[1])
+        graphic = np.concatenate([[False], is_graphic])[labels]
+        if not graphic.any():
+            return []
+
+        # Merge the separate shapes of one figure into a single region
+        merged = ndimage.binary_dilation(graphic, iterations=max(1, int(0.025 * ink.shape[1])))
+        labels, _ = ndimage.label(merged)
+        page_area = ink.shape[0] * ink.shape[1]
+        min_side = 0.05 * min(ink.shape)
+        boxes = []
+        for rows, cols in ndimage.find_objects(labels):
+            height = rows.stop - rows.start
+            width = cols.stop - cols.start
+            # Too small, or a thin strip such as a column rule
+            if height * width < self.min_figure_area * page_area or min(height, width) < min_side:
+                continue
+
+            boxes.append((
+                max(0, int(cols.start / scale) - padding),
+                max(0, int(rows.start / scale) - padding),
+                min(page_image.width, int(cols.stop / scale) + padding),
+                min(page_image.height, int(rows.stop / scale) + padding)
+            ))
+        return boxes
 
     def _generate_image_description(self, image):
         """Generate image caption using BLIP base (changed from BLIP-2)"""
@@ -188,8 +482,9 @@ class PDFTextImageExtractor:
         return f"This educational image shows: {description}"
 
     def _is_diagram(self, image):
-        """Simple heuristic to detect diagrams"""
-        return True  # Assuming academic PDFs contain mostly diagrams
+        """Diagrams are mostly blank background, photographs are not"""
+        gray = np.asarray(image.convert("L"))
+        return (gray > 230).mean() > 0.4
 
     def _analyze_educational_content(self, description):
         """Analyze educational value"""
@@ -0,0 +1,74 @@
+import json
+import os
+import hashlib
+import threading
+
+
+class PublishedTest:
+    """
+    In-memory copy of published_test.json
+
+    The parsed questions are kept as an immutable tuple and reloaded only
+    when publish() writes a new test or the file's mtime changes (e.g. it was
+    edited by hand). The rendered /test page is cached alongside, with an
+    ETag derived from its content.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.questions = ()
+        self.rendered = None
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _reload(self, mtime):
+        questions = []
+        if mtime is not None:
+            with open(self.path, "r", encoding="utf-8") as f:
+                questions = json.load(f)
+        self.questions = tuple(questions)
+        self.mtime = mtime
+        self.rendered = None
+
+    def load(self):
+        """The published questions, re-read only if the file changed"""
+        mtime = self._current_mtime()
+        if mtime != self.mtime:
+            with self.lock:
+                if mtime != self.mtime:
+                    self._reload(mtime)
+        return self.questions
+
+    def publish(self, questions):
+        """Write a new test atomically and refresh the cache"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(questions, f)
+        with self.lock:
+            os.replace(tmp_path, self.path)
+            self._reload(self._current_mtime())
+
+    def render(self, render_fn):
+        """
+        Return (html, etag) for the current test
+
+        Args:
+            render_fn (callable): Renders the page from the questions tuple;
+                called only when the test has changed
+        """
+        questions = self.load()
+        rendered = self.rendered
+        if rendered is None or rendered[0] is not questions:
+            html = render_fn(questions)
+            etag = hashlib.sha1(html.encode("utf-8")).hexdigest()
+            rendered = (questions, html, etag)
+            with self.lock:
+                if self.questions is questions:
+                    self.rendered = rendered
+        return rendered[1], rendered[2]
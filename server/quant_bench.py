@@ -0,0 +1,100 @@
+"""
+Compare float32 and dynamic int8 inference for Whisper, Nougat and BLIP.
+
+Runs each model on the same input in both modes and reports latency and how
+closely the int8 output matches the float32 output, to decide whether to set
+quantize_models in config.yaml.
+
+Usage: python quant_bench.py --audio class_audio.wav --pdf sample.pdf --runs 3
+"""
+import argparse
+import difflib
+import os
+import time
+import librosa
+from pdf2image import convert_from_path
+from stt import transcribe_batch
+from pdf_reader import PDFTextImageExtractor
+
+
+def time_runs(fn, runs):
+    """Run fn `runs` times and return (last output, average seconds)"""
+    output = None
+    start = time.perf_counter()
+    for _ in range(runs):
+        output = fn()
+    return output, (time.perf_counter() - start) / runs
+
+
+def similarity(a, b):
+    """Word-level agreement between two outputs (1.0 means identical)"""
+    return difflib.SequenceMatcher(None, a.split(), b.split()).ratio()
+
+
+def compare(label, run_fp32, run_int8, runs):
+    # Warm-up call so model loading is not counted in latency
+    run_fp32()
+    run_int8()
+
+    fp32_text, fp32_time = time_runs(run_fp32, runs)
+    int8_text, int8_time = time_runs(run_int8, runs)
+    agreement = similarity(fp32_text, int8_text)
+
+    print(f"\n{label}")
+    print(f"  float32: {fp32_time:.2f}s")
+    print(f"  int8:    {int8_time:.2f}s ({fp32_time / int8_time:.2f}x speedup)")
+    print(f"  output agreement: {agreement:.1%}")
+    return {
+        "model": label,
+        "fp32_seconds": fp32_time,
+        "int8_seconds": int8_time,
+        "agreement": agreement
+    }
+
+
+def bench_whisper(audio_path, runs):
+    audio_array, _ = librosa.load(audio_path, sr=16000, mono=True, duration=30)
+    return compare(
+        "Whisper (30s chunk)",
+        lambda: transcribe_batch([audio_array], quantized=False)[0],
+        lambda: transcribe_batch([audio_array], quantized=True)[0],
+        runs
+    )
+
+
+def bench_pdf_models(pdf_path, runs, page=1):
+    poppler_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "poppler", "Library", "bin")
+    page_image = convert_from_path(pdf_path, first_page=page, last_page=page, poppler_path=poppler_path)[0]
+    fp32 = PDFTextImageExtractor(quantized=False)
+    int8 = PDFTextImageExtractor(quantized=True)
+
+    return [
+        compare(
+            f"Nougat (page {page})",
+            lambda: fp32._extract_with_nougat(page_image),
+            lambda: int8._extract_with_nougat(page_image),
+            runs
+        ),
+        compare(
+            f"BLIP (page {page})",
+            lambda: fp32._generate_image_description(page_image)['general_description'],
+            lambda: int8._generate_image_description(page_image)['general_description'],
+            runs
+        )
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="float32 vs int8 accuracy/latency comparison")
+    parser.add_argument("--audio", help="Audio file for the Whisper comparison")
+    parser.add_argument("--pdf", help="PDF file for the Nougat and BLIP comparison")
+    parser.add_argument("--page", type=int, default=1, help="PDF page to use")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per mode")
+    args = parser.parse_args()
+
+    if not args.audio and not args.pdf:
+        parser.error("pass --audio and/or --pdf")
+    if args.audio:
+        bench_whisper(args.audio, args.runs)
+    if args.pdf:
+        bench_pdf_models(args.pdf, args.runs, args.page)
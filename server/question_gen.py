@@ -1,20 +1,9 @@
 # model used: phi3.5
 
-import requests
-import yaml
 import os
 import json
-
-# ✅ Load config from config.yaml
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
-
-API_KEY = config["api_key"]
-BASE_URL = config["model_server_base_url"]
-WORKSPACE_SLUG = config["workspace_slug"]
-
-# ✅ Construct the endpoint
-url = f"{BASE_URL}/workspace/{WORKSPACE_SLUG}/chat"
+from llm_client import get_client
+import retrieval
 
 def read_paragraphs():
     base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
@@ -26,26 +15,33 @@ def read_paragraphs():
         para2 = f.read()
     return para1, para2
 
-def generate_questions(para1, para2, num_questions=5):
-    # Dummy question generation for demonstration
-    questions = []
-    payload = {
-        "message": f"""Based on the paragraphs {para1} and {para2}, generate {num_questions} descriptive questions that test 
+def build_prompt(para1, para2, num_questions=5):
+    return f"""Based on the paragraphs {para1} and {para2}, generate {num_questions} descriptive questions that test 
         understanding of the key concepts.
-        The questions you are taking should be common to both the paragraphs.""",
-        "mode": "chat",  # or "query"
-        "sessionId": "my-session-id",
-        "attachments": [],
-        "reset": False
-    }
+        The questions you are taking should be common to both the paragraphs."""
+
+def split_questions(text):
+    return text.split('\n\n')[:-1]
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {API_KEY}"
-    }
+def generate_questions(para1, para2, num_questions=5, top_k=5):
+    # Only the passages both sources share go into the prompt, so it stays
+    # within Phi-3.5's 4K context whatever the chapter length
+    context1, context2 = retrieval.shared_context(para1, para2, top_k)
+    text = get_client().chat(build_prompt(context1, context2, num_questions), session_id="my-session-id")
+    return split_questions(text)
 
-    # ✅ Send the request
-    response = requests.post(url, headers=headers, json=payload)
-    print(response.json())
-    questions = response.json().get('textResponse', 'No response key found').split('\n\n')[:-1]
-    return questions
\ No newline at end of file
+def generate_questions_by_topic(para1, para2, num_topics=5, questions_per_topic=1):
+    """One small LLM call per shared topic (a matched lecture/textbook passage pair)"""
+    questions = []
+    for pair in retrieval.shared_passages(para1, para2, top_k=num_topics):
+        text = get_client().chat(
+            build_prompt(pair["lecture"], pair["textbook"], questions_per_topic),
+            session_id="my-session-id"
+        )
+        questions.extend(split_questions(text))
+    return questions
+
+def stream_questions(para1, para2, num_questions=5, top_k=5):
+    """Yield the model's reply chunk by chunk as it is generated"""
+    context1, context2 = retrieval.shared_context(para1, para2, top_k)
+    yield from get_client().stream_chat(build_prompt(context1, context2, num_questions), session_id="my-session-id")
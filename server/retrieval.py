@@ -0,0 +1,84 @@
+import re
+import numpy as np
+from analyzer import get_analyzer
+
+
+def get_model():
+    """The analyzer's MiniLM SentenceTransformer, shared with semantic grading"""
+    return get_analyzer().model
+
+
+def chunk_text(text, max_words=100):
+    """Split text into passages of whole sentences, at most ~max_words each"""
+    # Drop markdown headings and extraction boilerplate lines
+    lines = [l for l in text.splitlines() if l.strip() and not l.lstrip().startswith(("#", "**"))]
+    sentences = []
+    for sentence in re.split(r"(?<=[.!?])\s+", " ".join(" ".join(lines).split())):
+        # Tables, LaTeX and lists often have no sentence punctuation at all:
+        # hard-split runs longer than a passage
+        words = sentence.split()
+        for start in range(0, len(words), max_words):
+            sentences.append(" ".join(words[start:start + max_words]))
+
+    passages, current, current_words = [], [], 0
+    for sentence in sentences:
+        words = len(sentence.split())
+        if current and current_words + words > max_words:
+            passages.append(" ".join(current))
+            current, current_words = [], 0
+        current.append(sentence)
+        current_words += words
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def shared_passages(para1, para2, top_k=5, max_words=100, batch_size=64):
+    """
+    Find the passage pairs the two sources have in common
+
+    Both sources are chunked and embedded in one batched call; the top_k
+    most similar (lecture, textbook) pairs are picked greedily so no passage
+    is used twice, then returned in lecture order.
+
+    Returns:
+        list: dicts with lecture, textbook and score keys
+    """
+    lecture = chunk_text(para1, max_words)
+    textbook = chunk_text(para2, max_words)
+    if not lecture or not textbook:
+        return []
+
+    embeddings = get_model().encode(
+        lecture + textbook,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    )
+    similarity = embeddings[:len(lecture)] @ embeddings[len(lecture):].T
+
+    pairs = []
+    used_lecture, used_textbook = set(), set()
+    for flat in np.argsort(similarity, axis=None)[::-1]:
+        i, j = np.unravel_index(flat, similarity.shape)
+        if i in used_lecture or j in used_textbook:
+            continue
+        used_lecture.add(i)
+        used_textbook.add(j)
+        pairs.append((i, j, float(similarity[i, j])))
+        if len(pairs) >= top_k:
+            break
+
+    return [
+        {"lecture": lecture[i], "textbook": textbook[j], "score": score}
+        for i, j, score in sorted(pairs)
+    ]
+
+
+def shared_context(para1, para2, top_k=5, max_words=100):
+    """Bounded stand-ins for the two full sources, built from shared passages"""
+    pairs = shared_passages(para1, para2, top_k, max_words)
+    return (
+        "\n".join(p["lecture"] for p in pairs),
+        "\n".join(p["textbook"] for p in pairs)
+    )
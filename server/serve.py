@@ -0,0 +1,97 @@
+"""
+Production launcher for the SnapClass server.
+
+Runs app.py under gunicorn (Linux/macOS, worker processes + threads) or
+waitress (Windows, threads only) instead of Flask's development server.
+Models are loaded once before workers fork so their weights are shared
+copy-on-write. Per-endpoint latency is reported at /metrics and in the
+X-Response-Time header.
+
+Usage: python serve.py --workers 2 --threads 16
+"""
+import argparse
+import os
+import socket
+import models
+from app import app
+
+
+def run_gunicorn(host, port, workers, threads, access_log):
+    from gunicorn.app.base import BaseApplication
+
+    class GunicornServer(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "threads": threads,
+        # Threaded workers keep SSE progress streams from pinning a process
+        "worker_class": "gthread",
+        "preload_app": True,
+        "timeout": 120,
+        "keepalive": 5
+    }
+    if access_log:
+        options["accesslog"] = "-"
+        options["access_log_format"] = '%(h)s "%(r)s" %(s)s %(b)s %(M)sms'
+    GunicornServer(app, options).run()
+
+
+def run_waitress(host, port, threads):
+    from waitress import serve
+    serve(app, host=host, port=port, threads=threads)
+
+
+def default_server():
+    if os.name == "nt":
+        return "waitress"
+    try:
+        import gunicorn
+        return "gunicorn"
+    except ImportError:
+        return "waitress"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run SnapClass with a production WSGI server")
+    parser.add_argument("--server", choices=["gunicorn", "waitress"], default=None,
+                        help="Defaults to gunicorn where available, waitress on Windows")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (gunicorn only)")
+    parser.add_argument("--threads", type=int, default=16, help="Threads per worker")
+    parser.add_argument("--no-preload-models", action="store_true",
+                        help="Load models lazily in each worker instead of before forking")
+    parser.add_argument("--access-log", action="store_true", help="Log every request with its latency")
+    args = parser.parse_args()
+
+    server = args.server or default_server()
+
+    # Job status, the question bank and the analysis refresh are shared
+    # through SQLite, so any worker can answer any request. Each upload is
+    # processed by the worker that accepted it.
+    if server == "waitress" and args.workers > 1:
+        print("waitress runs a single process; ignoring --workers")
+
+    if not args.no_preload_models:
+        print("Loading models before starting workers...")
+        models.warm_up(background=False)
+
+    ip = socket.gethostbyname(socket.gethostname())
+    print(f"Server running at http://{ip}:{args.port} ({server}, {args.workers} worker(s) x {args.threads} threads)")
+
+    if server == "gunicorn":
+        run_gunicorn(args.host, args.port, args.workers, args.threads, args.access_log)
+    else:
+        run_waitress(args.host, args.port, args.threads)
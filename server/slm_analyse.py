@@ -1,20 +1,33 @@
 # model used: phi3.5
 
-import requests
-import yaml
 import os
 import json
+import uuid
+import hashlib
+import threading
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import utils
+import retrieval
+from llm_client import get_client
 
-# ✅ Load config from config.yaml
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+# Map-reduce settings: concurrent map calls against the local server and
+# the word budget for summaries merged in one reduce call
+MAP_WORKERS = 4
+SUMMARY_WORDS = 80
+REDUCE_WORD_BUDGET = 1500
+SINGLE_PROMPT_MAX_STUDENTS = 5
 
-API_KEY = config["api_key"]
-BASE_URL = config["model_server_base_url"]
-WORKSPACE_SLUG = config["workspace_slug"]
+# Last generated analysis and the digest of the inputs it was built from
+ANALYSIS_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output", "analysis_cache.json")
 
-# ✅ Construct the endpoint
-url = f"{BASE_URL}/workspace/{WORKSPACE_SLUG}/chat"
+# At most one analysis refresh at a time across all server processes; the
+# lease outlives a normal refresh and lapses if its process dies
+REFRESH_LEASE = "analysis_refresh"
+REFRESH_LEASE_SECONDS = 15 * 60
+# After a failed refresh, wait this long before retrying the same inputs
+REFRESH_RETRY_SECONDS = 5 * 60
 
 def read_paragraphs():
     base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
@@ -28,11 +41,9 @@ def read_paragraphs():
 
 
 def read_submissions():
-    """Read and organize questions and answers from test_submissions.json"""
+    """Read and organize questions and answers from the submissions store"""
     try:
-        submissions_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_submissions.json")
-        with open(submissions_file, "r", encoding="utf-8") as f:
-            submissions = json.load(f)
+        submissions = utils.load_test_submissions()
         
         # Get unique questions from the first submission
         questions = []
@@ -50,24 +61,13 @@ def read_submissions():
             "questions": questions,
             "student_answers": student_answers
         }
-    except FileNotFoundError:
-        print("test_submissions.json not found")
-        return {"questions": [], "student_answers": {}}
     except Exception as e:
         print(f"Error reading submissions: {str(e)}")
         return {"questions": [], "student_answers": {}}
 
 
-def get_analysis():
-    """Get analysis of student submissions using the AI model"""
-    try:
-        # Get submissions and paragraphs
-        submissions_data = read_submissions()
-        para1, para2 = read_paragraphs()
-        
-        # Prepare the message for the AI model
-        payload = {
-            "message": f"""Analyze the following test submissions and provide insights:
+def build_prompt(submissions_data, para1, para2):
+    return f"""Analyze the following test submissions and provide insights:
 
 Materials used for questions:
 1. Audio Transcription: {para1}
@@ -77,24 +77,126 @@ Questions asked: {submissions_data['questions']}
 
 Student Answers: {submissions_data['student_answers']}
 
+Please provide:
+1. Overall class performance analysis
+2. Common misconceptions or areas where students struggled
+3. Suggestions for improvement
+4. Individual student performance highlights"""
+
+
+def _fresh_session(prefix):
+    # A new session per call keeps chat history out of the prompt
+    return f"{prefix}-{uuid.uuid4().hex}"
+
+
+def summarize_student(name, questions, answers, context):
+    """Map step: short summary of one student's answers, cached by content"""
+    key = hashlib.sha256(json.dumps(
+        [name, questions, answers, context], sort_keys=True
+    ).encode("utf-8")).hexdigest()
+    cached = utils.load_analysis_summary(key)
+    if cached is not None:
+        return cached
+
+    qa = "\n".join(f"Q: {q}\nA: {a}" for q, a in zip(questions, answers))
+    summary = get_client().chat(
+        f"""Reference material:
+{context}
+
+Student {name} answered:
+{qa}
+
+In at most {SUMMARY_WORDS} words, summarize this student's understanding: what they got right,
+misconceptions, and which questions they struggled with.""",
+        session_id=_fresh_session("analysis-map")
+    ).strip()
+    utils.save_analysis_summary(key, name, summary)
+    return summary
+
+
+def _merge_summaries(questions, summaries):
+    """Reduce step, merging in groups when the summaries exceed one prompt"""
+    groups, current, words = [], [], 0
+    for name, summary in summaries:
+        summary_words = len(summary.split())
+        if current and words + summary_words > REDUCE_WORD_BUDGET:
+            groups.append(current)
+            current, words = [], 0
+        current.append((name, summary))
+        words += summary_words
+    if current:
+        groups.append(current)
+
+    if len(groups) > 1:
+        # Condense each group first, then merge the condensed summaries
+        with ThreadPoolExecutor(max_workers=MAP_WORKERS) as pool:
+            condensed = list(pool.map(lambda group: get_client().chat(
+                "Condense these student summaries into one summary of at most "
+                f"{SUMMARY_WORDS * 2} words, keeping names of students who struggled:\n\n"
+                + "\n\n".join(f"{name}: {summary}" for name, summary in group),
+                session_id=_fresh_session("analysis-reduce")
+            ).strip(), groups))
+        return _merge_summaries(questions, [(f"Group {i + 1}", s) for i, s in enumerate(condensed)])
+
+    student_summaries = "\n\n".join(f"{name}: {summary}" for name, summary in groups[0]) if groups else ""
+    return get_client().chat(
+        f"""Analyze the following test results and provide insights:
+
+Questions asked: {questions}
+
+Per-student summaries:
+{student_summaries}
+
 Please provide:
 1. Overall class performance analysis
 2. Common misconceptions or areas where students struggled
 3. Suggestions for improvement
 4. Individual student performance highlights""",
-            "mode": "chat",
-            "sessionId": "analysis-session",
-            "attachments": [],
-            "reset": False
-        }
+        session_id=_fresh_session("analysis-reduce")
+    )
+
+
+def map_reduce_analysis(submissions_data, para1, para2):
+    """Summarize each student concurrently, then merge the summaries"""
+    questions = submissions_data["questions"]
+    context = "\n".join(retrieval.shared_context(para1, para2, top_k=3))
+    students = list(submissions_data["student_answers"].items())
+
+    with ThreadPoolExecutor(max_workers=MAP_WORKERS) as pool:
+        summaries = list(pool.map(
+            lambda item: (item[0], summarize_student(item[0], questions, item[1], context)),
+            students
+        ))
+    return _merge_summaries(questions, summaries)
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {API_KEY}"
-        }
 
-        response = requests.post(url, headers=headers, json=payload)
-        analysis_text = response.json().get('textResponse', 'No analysis available')
+def get_analysis(map_reduce=None):
+    """
+    Get analysis of student submissions using the AI model
+
+    Args:
+        map_reduce (bool): Summarize per student and merge, instead of one
+            prompt with every answer. Defaults to on for classes larger than
+            SINGLE_PROMPT_MAX_STUDENTS.
+    """
+    try:
+        # Get submissions and paragraphs
+        submissions_data = read_submissions()
+        para1, para2 = read_paragraphs()
+        if map_reduce is None:
+            map_reduce = len(submissions_data["student_answers"]) > SINGLE_PROMPT_MAX_STUDENTS
+
+        if map_reduce:
+            analysis_text = map_reduce_analysis(submissions_data, para1, para2) or 'No analysis available'
+            return {
+                "success": True,
+                "analysis": analysis_text
+            }
+        
+        analysis_text = get_client().chat(
+            build_prompt(submissions_data, para1, para2),
+            session_id="analysis-session"
+        ) or 'No analysis available'
         
         return {
             "success": True,
@@ -105,3 +207,108 @@ Please provide:
             "success": False,
             "error": str(e)
         }
+
+
+def analysis_digest(submissions, para1, para2):
+    """Digest of everything the analysis depends on"""
+    payload = json.dumps([submissions, para1, para2], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_cached_analysis():
+    try:
+        with open(ANALYSIS_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _save_cached_analysis(digest, analysis):
+    os.makedirs(os.path.dirname(ANALYSIS_CACHE_FILE), exist_ok=True)
+    tmp_path = ANALYSIS_CACHE_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "digest": digest,
+            "analysis": analysis,
+            "generated_at": str(datetime.datetime.now())
+        }, f)
+    os.replace(tmp_path, ANALYSIS_CACHE_FILE)
+
+
+def load_refresh_failure():
+    """The last failed refresh as a dict with digest, error and time, or None"""
+    failure = utils.get_meta("analysis_refresh_failure")
+    return json.loads(failure) if failure else None
+
+
+def _refresh(digest, owner):
+    try:
+        try:
+            result = get_analysis()
+            if result["success"]:
+                _save_cached_analysis(digest, result["analysis"])
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        if result["success"]:
+            utils.set_meta("analysis_refresh_failure", None)
+        else:
+            utils.set_meta("analysis_refresh_failure", json.dumps({
+                "digest": digest,
+                "error": result["error"],
+                "time": time.time()
+            }))
+    finally:
+        utils.release_lease(REFRESH_LEASE, owner)
+
+
+def start_refresh(digest):
+    """Regenerate the analysis in the background unless already running"""
+    owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+    if not utils.claim_lease(REFRESH_LEASE, owner, REFRESH_LEASE_SECONDS):
+        return False
+    threading.Thread(target=_refresh, args=(digest, owner), daemon=True).start()
+    return True
+
+
+def get_cached_analysis():
+    """
+    Serve the last analysis immediately, regenerating it in the background
+    when the submissions or source documents have changed
+
+    Returns:
+        dict: analysis (or None), submissions, stale, refreshing,
+            generated_at and error
+    """
+    submissions = utils.load_test_submissions()
+    state = {
+        "analysis": None,
+        "submissions": submissions,
+        "stale": False,
+        "refreshing": False,
+        "generated_at": None,
+        "error": None
+    }
+    try:
+        para1, para2 = read_paragraphs()
+    except Exception as e:
+        state["error"] = str(e)
+        return state
+
+    digest = analysis_digest(submissions, para1, para2)
+    cached = load_cached_analysis()
+    if cached:
+        state["analysis"] = cached["analysis"]
+        state["generated_at"] = cached["generated_at"]
+    if not cached or cached["digest"] != digest:
+        state["stale"] = True
+        # A refresh that failed for these same inputs is reported and only
+        # retried after a backoff; new submissions retry straight away
+        failure = load_refresh_failure()
+        if failure and failure["digest"] == digest:
+            state["error"] = failure["error"]
+            if time.time() - failure["time"] >= REFRESH_RETRY_SECONDS:
+                start_refresh(digest)
+        else:
+            start_refresh(digest)
+    state["refreshing"] = utils.lease_held(REFRESH_LEASE)
+    return state
@@ -1,12 +1,10 @@
 import torch
 import librosa
+import soundfile
+import audioread
 import numpy as np
 import sys, os
-from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq
-
-# Load model and processor (match sizes!)
-processor = AutoProcessor.from_pretrained("openai/whisper-small")
-model = AutoModelForSpeechSeq2Seq.from_pretrained("openai/whisper-small")
+from models import get_model
 
 def chunk_audio(audio_array, chunk_duration_sec=30, sampling_rate=16000):
     """Split audio into chunks of specified duration (in seconds)."""
@@ -16,18 +14,86 @@ def chunk_audio(audio_array, chunk_duration_sec=30, sampling_rate=16000):
         for i in range(0, len(audio_array), chunk_size)
     ]
 
-def transcribe_chunk(chunk_array, sampling_rate=16000, max_new_tokens=444):
-    """Transcribe a single audio chunk using Whisper."""
-    # Pad or trim to 30 seconds
+def speech_regions(audio_array, sampling_rate=16000, top_db=40, min_silence_sec=0.3,
+                   frame_length=2048, hop_length=512):
+    """Non-silent ``[start, end]`` sample ranges, merged across short pauses."""
+    min_gap = int(sampling_rate * min_silence_sec)
+    intervals = librosa.effects.split(
+        audio_array, top_db=top_db, frame_length=frame_length, hop_length=hop_length
+    )
+
+    # Merge regions separated by pauses too short to be a real break
+    merged = []
+    for start, end in intervals:
+        if merged and start - merged[-1][1] < min_gap:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+def split_at_last_pause(audio_array, sampling_rate=16000, max_duration_sec=30, hop_length=512):
+    """Split audio into ``(head, tail)`` at the last pause.
+
+    ``tail`` is the speech still running at the end of the audio, which may
+    continue in the next block; it is empty when the audio ends in silence.
+    Speech longer than one window is cut where ``segment_on_silence`` would
+    hard-split it anyway, so the tail never exceeds ``max_duration_sec``.
+    """
+    max_len = sampling_rate * max_duration_sec
+    regions = speech_regions(audio_array, sampling_rate, hop_length=hop_length)
+    # Interval ends are frame-aligned; within a hop of the end counts as the end
+    if not regions or regions[-1][1] < len(audio_array) - hop_length:
+        return audio_array, audio_array[:0]
+    cut = regions[-1][0] + (len(audio_array) - regions[-1][0]) // max_len * max_len
+    return audio_array[:cut], audio_array[cut:]
+
+def segment_on_silence(audio_array, sampling_rate=16000, max_duration_sec=30,
+                       top_db=40, min_silence_sec=0.3, frame_length=2048, hop_length=512):
+    """Split audio on pauses, dropping silent stretches.
+
+    Non-silent regions are found by frame energy (``top_db`` below the peak
+    counts as silence) and packed greedily into windows of at most
+    ``max_duration_sec``, so chunk boundaries fall inside pauses instead of
+    mid-word. Regions longer than a full window are hard-split as a last resort.
+    """
+    max_len = sampling_rate * max_duration_sec
+    merged = speech_regions(audio_array, sampling_rate, top_db, min_silence_sec, frame_length, hop_length)
+
+    # Hard-split anything that cannot fit in one window
+    regions = []
+    for start, end in merged:
+        for i in range(start, end, max_len):
+            regions.append((i, min(i + max_len, end)))
+
+    # Pack consecutive regions into windows, skipping the silence between them
+    chunks, current, current_len = [], [], 0
+    for start, end in regions:
+        length = end - start
+        if current and current_len + length > max_len:
+            chunks.append(np.concatenate(current))
+            current, current_len = [], 0
+        current.append(audio_array[start:end])
+        current_len += length
+    if current:
+        chunks.append(np.concatenate(current))
+
+    return chunks
+
+def pad_chunk(chunk_array, sampling_rate=16000):
+    """Pad or trim a chunk to the 30 second window Whisper expects."""
     target_length = sampling_rate * 30
     if len(chunk_array) > target_length:
-        chunk_array = chunk_array[:target_length]
-    else:
-        chunk_array = np.pad(chunk_array, (0, target_length - len(chunk_array)), 'constant')
+        return chunk_array[:target_length]
+    return np.pad(chunk_array, (0, target_length - len(chunk_array)), 'constant')
+
+def transcribe_batch(chunk_arrays, sampling_rate=16000, max_new_tokens=444, quantized=None):
+    """Transcribe several audio chunks with a single Whisper generate call."""
+    processor, model = get_model("whisper", quantized=quantized)
+    padded = [pad_chunk(chunk, sampling_rate) for chunk in chunk_arrays]
 
-    # Prepare input
+    # Prepare stacked input features (batch, n_mels, frames)
     inputs = processor(
-        chunk_array,
+        padded,
         sampling_rate=sampling_rate,
         return_tensors="pt",
         return_attention_mask=True
@@ -46,25 +112,40 @@ def transcribe_chunk(chunk_array, sampling_rate=16000, max_new_tokens=444):
             forced_decoder_ids=None
         )
 
-    # Decode result
-    transcription = processor.batch_decode(
+    # Decode results, one per chunk
+    transcriptions = processor.batch_decode(
         predicted_ids,
         skip_special_tokens=True,
         clean_up_tokenization_spaces=True
-    )[0]
+    )
+
+    return [text.strip() for text in transcriptions]
+
+def transcribe_chunk(chunk_array, sampling_rate=16000, max_new_tokens=444):
+    """Transcribe a single audio chunk using Whisper."""
+    return transcribe_batch([chunk_array], sampling_rate, max_new_tokens)[0]
 
-    return transcription.strip()
+def transcribe_audio(audio_path, output_dir="output", batch_size=4, split_on_silence=True):
+    """Transcribe an entire .wav file using chunking and save to markdown.
 
-def transcribe_audio(audio_path, output_dir="output"):
-    """Transcribe an entire .wav file using chunking and save to markdown."""
+    Chunks are decoded ``batch_size`` at a time so each generate call keeps
+    all CPU cores busy; ``batch_size=1`` restores one call per chunk. With
+    ``split_on_silence`` chunks are cut at pauses and silence is skipped,
+    otherwise the audio is sliced every 30 seconds.
+    """
     audio_array, _ = librosa.load(audio_path, sr=16000, mono=True)
-    audio_chunks = chunk_audio(audio_array)
+    if split_on_silence:
+        audio_chunks = segment_on_silence(audio_array)
+    else:
+        audio_chunks = chunk_audio(audio_array)
+    batch_size = max(1, int(batch_size))
 
     full_transcription = ""
-    for i, chunk in enumerate(audio_chunks):
-        print(f"Transcribing chunk {i+1}/{len(audio_chunks)}...")
-        chunk_text = transcribe_chunk(chunk)
-        full_transcription += chunk_text + " "
+    for start in range(0, len(audio_chunks), batch_size):
+        batch = audio_chunks[start:start + batch_size]
+        print(f"Transcribing chunks {start+1}-{start+len(batch)}/{len(audio_chunks)}...")
+        for chunk_text in transcribe_batch(batch):
+            full_transcription += chunk_text + " "
 
     # Save to markdown
     os.makedirs(output_dir, exist_ok=True)
@@ -75,6 +156,112 @@ def transcribe_audio(audio_path, output_dir="output"):
 
     return {"text": full_transcription.strip(), "output_path": output_path}
 
+def _decode_blocks(audio_path, block_duration_sec):
+    """Yield ``(mono_block, native_sr)`` pairs straight from the file.
+
+    soundfile streams the formats it can read (wav, flac, ogg, mp3); anything
+    else (m4a, aac, ...) is decoded incrementally through audioread, the same
+    fallback ``librosa.load`` uses.
+    """
+    try:
+        native_sr = soundfile.info(audio_path).samplerate
+    except RuntimeError:
+        native_sr = None
+
+    if native_sr:
+        blocks = librosa.stream(
+            audio_path,
+            block_length=block_duration_sec,
+            frame_length=native_sr,
+            hop_length=native_sr,
+            mono=True
+        )
+        for block in blocks:
+            yield block, native_sr
+        return
+
+    with audioread.audio_open(audio_path) as f:
+        native_sr, channels = f.samplerate, f.channels
+        block_len = native_sr * block_duration_sec * channels
+        pending, pending_len = [], 0
+        for buf in f:
+            samples = librosa.util.buf_to_float(buf, n_bytes=2, dtype=np.float32)
+            pending.append(samples)
+            pending_len += len(samples)
+            while pending_len >= block_len:
+                data = np.concatenate(pending)
+                yield data[:block_len].reshape(-1, channels).mean(axis=1), native_sr
+                pending, pending_len = [data[block_len:]], len(data) - block_len
+        if pending_len:
+            data = np.concatenate(pending)
+            # Drop a trailing partial frame so the channels stay interleaved
+            data = data[:len(data) // channels * channels]
+            yield data.reshape(-1, channels).mean(axis=1), native_sr
+
+def stream_audio_blocks(audio_path, block_duration_sec=120, sampling_rate=16000):
+    """Yield the audio in fixed-length blocks, resampled to ``sampling_rate``.
+
+    Only one block is held in memory at a time, so peak memory does not grow
+    with the length of the recording.
+    """
+    for block, native_sr in _decode_blocks(audio_path, block_duration_sec):
+        if native_sr != sampling_rate:
+            block = librosa.resample(block, orig_sr=native_sr, target_sr=sampling_rate)
+        yield block
+
+def stream_transcription(audio_path, output_dir="output", batch_size=4, split_on_silence=True,
+                         cached_chunks=None):
+    """Transcribe a file block by block, yielding text as soon as it is decoded.
+
+    Each decoded chunk is appended to ``<name>_transcription.md`` before it
+    is yielded, so the markdown file always holds the transcript so far.
+    Yields dicts with ``index``, ``text``, ``cached`` and ``output_path`` keys
+    for every chunk, including silent ones with empty text. Chunks whose
+    index is in ``cached_chunks`` reuse that text instead of being decoded,
+    which lets an interrupted run resume.
+    """
+    batch_size = max(1, int(batch_size))
+    cached_chunks = cached_chunks or {}
+    os.makedirs(output_dir, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(audio_path))[0]
+    output_path = os.path.join(output_dir, f"{base_name}_transcription.md")
+
+    def blocks():
+        # Each block holds one batch worth of 30 second windows. With
+        # split_on_silence, speech still running at the end of a block is
+        # carried into the next one so no chunk is cut mid-word
+        carry = np.zeros(0, dtype=np.float32)
+        for block in stream_audio_blocks(audio_path, block_duration_sec=30 * batch_size):
+            if not split_on_silence:
+                yield chunk_audio(block)
+                continue
+            head, carry = split_at_last_pause(np.concatenate([carry, block]))
+            if len(head):
+                yield segment_on_silence(head)
+        if len(carry):
+            yield segment_on_silence(carry)
+
+    index = 0
+    written = False
+    with open(output_path, "w", encoding="utf-8") as f:
+        for chunks in blocks():
+            for start in range(0, len(chunks), batch_size):
+                batch = chunks[start:start + batch_size]
+                indices = range(index, index + len(batch))
+                to_decode = [i for i in indices if i not in cached_chunks]
+                decoded = transcribe_batch([batch[i - index] for i in to_decode]) if to_decode else []
+                texts = dict(zip(to_decode, decoded))
+                index += len(batch)
+
+                for i in indices:
+                    cached = i in cached_chunks
+                    chunk_text = cached_chunks[i] if cached else texts[i]
+                    if chunk_text:
+                        f.write((" " if written else "") + chunk_text)
+                        f.flush()
+                        written = True
+                    yield {"index": i, "text": chunk_text, "cached": cached, "output_path": output_path}
+
 if __name__ == "__main__":
 
     audio_file = r"C:/Users/Qualcomm/Desktop/class_audio.wav"
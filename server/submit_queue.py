@@ -0,0 +1,91 @@
+import threading
+import os
+import queue
+import atexit
+import datetime
+import time
+import utils
+
+
+class SubmissionQueue:
+    """
+    Acknowledge test submissions immediately and persist them in batches
+
+    /submit scores the answers and enqueues the record; a single writer
+    thread collects whatever is pending (up to `batch_size`, waiting at most
+    `linger` seconds for more) and writes it in one transaction. At the end
+    of a test the whole class lands in a handful of writes instead of one
+    transaction per student.
+    """
+
+    def __init__(self, batch_size=64, linger=0.05):
+        self.batch_size = batch_size
+        self.linger = linger
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.pid = None
+        atexit.register(self.flush)
+
+    def _ensure_writer(self):
+        # Started lazily, and again after a fork: threads do not survive
+        # into worker processes when the app is preloaded
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._write_loop, daemon=True).start()
+
+    def submit(self, name, questions, answers, result):
+        """Queue a scored submission for persistence"""
+        self._ensure_writer()
+        self.pending.put({
+            "name": name,
+            "questions": questions,
+            "answers": answers,
+            "score": result["score"],
+            "total": result["total"],
+            "timestamp": str(datetime.datetime.now())
+        })
+
+    def flush(self):
+        """Block until every queued submission has been written"""
+        self.pending.join()
+
+    def _next_batch(self):
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.pending.get(timeout=remaining))
+                else:
+                    # Past the deadline: only take what is already waiting
+                    batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
+
+    def _write(self, batch, retries=3):
+        for attempt in range(retries):
+            try:
+                utils.save_submissions_batch(batch)
+                return
+            except Exception as e:
+                print(f"Failed to save {len(batch)} submissions (attempt {attempt + 1}): {str(e)}")
+                time.sleep(0.5 * (attempt + 1))
+        # Keep going rather than losing the rest of the class; fall back to
+        # one transaction per submission so a single bad record is isolated
+        for record in batch:
+            try:
+                utils.save_submissions_batch([record])
+            except Exception as e:
+                print(f"Dropped submission from {record['name']}: {str(e)}")
@@ -1,14 +1,25 @@
 import threading
 import os
 from datetime import datetime
-from stt import transcribe_audio
+from stt import stream_transcription
 from pdf_reader import PDFTextImageExtractor
+from cache import IngestionCache
+from models import quantization_enabled
+
+# Settings that change extraction output; part of every cache key
+AUDIO_SETTINGS = {"model": "openai/whisper-small", "split_on_silence": True}
+PDF_SETTINGS = {
+    "models": ["facebook/nougat-small", "Salesforce/blip-image-captioning-base"],
+    "text_layer": True,
+    "dpi": 200
+}
 
 class ContentProcessor:
-    def __init__(self, output_dir="output"):
+    def __init__(self, output_dir="output", use_cache=True):
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
         self.status_callback = None
+        self.cache = IngestionCache(os.path.join(output_dir, "cache")) if use_cache else None
         
     def set_status_callback(self, callback):
         """Set callback function for status updates"""
@@ -16,7 +27,10 @@ class ContentProcessor:
         
     def _update_status(self, message, is_content=False):
         """Helper function to send status updates"""
-        if self.status_callback:
+        if self.status_callback and isinstance(message, dict):
+            # Already formatted (e.g. forwarded from the PDF extractor)
+            self.status_callback(message)
+        elif self.status_callback:
             self.status_callback({
                 'type': 'content' if is_content else 'status',
                 'message': message if not is_content else message,
@@ -27,15 +41,35 @@ class ContentProcessor:
         """Process audio file and convert to text"""
         try:
             self._update_status("Starting audio transcription...")
+            base_name = os.path.splitext(os.path.basename(audio_path))[0]
+            output_path = os.path.join(self.output_dir, f"{base_name}_transcription.md")
+
+            # Same recording processed before: reuse the transcript
+            key = None
+            cached_chunks = {}
+            if self.cache:
+                key = self.cache.key_for(audio_path, "audio", dict(AUDIO_SETTINGS, quantized=quantization_enabled()))
+                if self.cache.copy_final(key, output_path):
+                    self._update_status(f"Audio transcription loaded from cache: {output_path}")
+                    return output_path
+                cached_chunks = {i: part["text"] for i, part in self.cache.load_parts(key).items()}
+                if cached_chunks:
+                    self._update_status(f"Resuming transcription after {len(cached_chunks)} cached chunks")
 
-            # Transcribe audio
-            result = transcribe_audio(
+            # Transcribe audio, forwarding each chunk as soon as it is decoded
+            for partial in stream_transcription(
                 audio_path=audio_path,
-                output_dir=self.output_dir
-            )
+                output_dir=self.output_dir,
+                cached_chunks=cached_chunks
+            ):
+                if key and not partial["cached"]:
+                    self.cache.save_part(key, partial["index"], {"text": partial["text"]})
+                if partial["text"]:
+                    self._update_status(partial["text"], is_content=True)
 
-            # Save to markdown (already done in stt.py)
-            output_path = result["output_path"]
+            # Markdown is written incrementally by stt.py
+            if key:
+                self.cache.save_final(key, output_path)
 
             self._update_status(f"Audio transcription completed and saved to: {output_path}")
             return output_path
@@ -48,22 +82,38 @@ class ContentProcessor:
         """Process PDF file and extract content"""
         try:
             self._update_status("Starting PDF processing...")
+            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+            output_path = os.path.join(self.output_dir, f"{base_name}_content.md")
+
+            # Same PDF processed before: reuse the extracted markdown
+            key = None
+            cached_pages = {}
+            page_callback = None
+            if self.cache:
+                key = self.cache.key_for(pdf_path, "pdf", dict(PDF_SETTINGS, quantized=quantization_enabled()))
+                if self.cache.copy_final(key, output_path):
+                    self._update_status(f"PDF content loaded from cache: {output_path}")
+                    return output_path
+                cached_pages = self.cache.load_parts(key)
+                page_callback = lambda page_num, page: self.cache.save_part(key, page_num, page)
             
             # Initialize PDF extractor
-            extractor = PDFTextImageExtractor()
+            extractor = PDFTextImageExtractor(use_text_layer=PDF_SETTINGS["text_layer"])
             
             # Process PDF with status updates
             pdf_content = extractor.extract_full_content(
                 pdf_path,
                 output_dir=self.output_dir,
-                status_callback=self._update_status
+                status_callback=self._update_status,
+                dpi=PDF_SETTINGS["dpi"],
+                cached_pages=cached_pages,
+                page_callback=page_callback
             )
             
             # Save to markdown
-            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-            output_path = os.path.join(self.output_dir, f"{base_name}_content.md")
-            
             extractor.save_to_markdown(pdf_content, output_path)
+            if key:
+                self.cache.save_final(key, output_path)
             self._update_status(f"PDF processing completed and saved to: {output_path}")
             return output_path
             
@@ -87,15 +137,24 @@ def process_files(audio_path, pdf_path, status_callback=None):
     if status_callback:
         processor.set_status_callback(status_callback)
     
+    # Exceptions raised inside the threads, re-raised once both finish
+    errors = []
+
+    def run(target, path):
+        try:
+            target(path)
+        except Exception as e:
+            errors.append(e)
+
     # Create threads for parallel processing
     audio_thread = threading.Thread(
-        target=processor.process_audio,
-        args=(audio_path,)
+        target=run,
+        args=(processor.process_audio, audio_path)
     )
     
     pdf_thread = threading.Thread(
-        target=processor.process_pdf,
-        args=(pdf_path,)
+        target=run,
+        args=(processor.process_pdf, pdf_path)
     )
     
     # Start both threads
@@ -105,6 +164,9 @@ def process_files(audio_path, pdf_path, status_callback=None):
     # Wait for both threads to complete
     audio_thread.join()
     pdf_thread.join()
+
+    if errors:
+        raise errors[0]
     
     # Return paths to generated files
     audio_output = os.path.join(
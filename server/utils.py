@@ -1,6 +1,9 @@
 import json
 import os
 import datetime
+import sqlite3
+import threading
+import time
 
 # Get the directory where utils.py is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -10,26 +13,281 @@ QUESTIONS_FILE = os.path.join(BASE_DIR, "questions.json")
 STUDENT_DATA_FILE = os.path.join(BASE_DIR, "student_analysis.json")
 TEST_SUBMISSIONS_FILE = os.path.join(BASE_DIR, "test_submissions.json")
 
+# SQLite store (WAL mode) replacing the JSON files above, which are only
+# read once by the importer
+DATABASE_FILE = os.path.join(BASE_DIR, "snapclass.db")
 
-def save_question(question, options, answer):
-    data = load_questions()
-    data.append({
-        "question": question,
-        "options": options,
-        "answer": answer
-    })
-    with open(QUESTIONS_FILE, "w") as f:
-        json.dump(data, f)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question TEXT NOT NULL,
+    options TEXT NOT NULL,
+    answer TEXT
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_name TEXT,
+    timestamp TEXT NOT NULL,
+    questions_and_answers TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_student ON submissions (student_name);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_name ON results (name);
+CREATE TABLE IF NOT EXISTS analysis_summaries (
+    key TEXT PRIMARY KEY,
+    student_name TEXT,
+    summary TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    description TEXT,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    pid INTEGER,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_updates (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
 
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
 
-def load_questions():
+# Question bank cache as (version, questions). save_question bumps the
+# questions_version row, so every server process notices new questions
+_questions_cache = None
+_questions_lock = threading.Lock()
+
+
+def get_db():
+    """Per-thread connection to the SQLite store, created on first use"""
+    global _initialized
+    conn = getattr(_local, "conn", None)
+    # Connections must not cross a fork into server worker processes
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(DATABASE_FILE, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        _local.conn = conn
+        _local.pid = os.getpid()
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.executescript(SCHEMA)
+                import_json_files(conn)
+                _initialized = True
+    return conn
+
+
+def _read_json_list(path):
     try:
-        with open(QUESTIONS_FILE, "r") as f:
-            return json.load(f)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+            return data if isinstance(data, list) else []
     except:
         return []
 
 
+def import_json_files(conn=None):
+    """
+    One-time import of the legacy JSON files into SQLite
+
+    Runs inside a single transaction and records itself in the meta table,
+    so later calls are no-ops and the JSON files are left untouched.
+    """
+    conn = conn or get_db()
+    with conn:
+        done = conn.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone()
+        if done:
+            return False
+
+        conn.executemany(
+            "INSERT INTO questions (question, options, answer) VALUES (?, ?, ?)",
+            [
+                (q.get("question"), json.dumps(q.get("options", [])), q.get("answer"))
+                for q in _read_json_list(QUESTIONS_FILE)
+            ]
+        )
+        conn.executemany(
+            "INSERT INTO submissions (student_name, timestamp, questions_and_answers) VALUES (?, ?, ?)",
+            [
+                (s.get("student_name"), s.get("timestamp", ""), json.dumps(s.get("questions_and_answers", [])))
+                for s in _read_json_list(TEST_SUBMISSIONS_FILE)
+            ]
+        )
+        conn.executemany(
+            "INSERT INTO results (name, score, total) VALUES (?, ?, ?)",
+            [
+                (r.get("name"), r.get("score", 0), r.get("total", 0))
+                for r in _read_json_list(STUDENT_DATA_FILE)
+            ]
+        )
+        conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (str(datetime.datetime.now()),))
+    return True
+
+
+def get_meta(key):
+    row = get_db().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else None
+
+
+def set_meta(key, value):
+    conn = get_db()
+    with conn:
+        if value is None:
+            conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+        else:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+def claim_lease(name, owner, seconds):
+    """
+    Take a named lease shared by every server process
+
+    Returns True if it was free or had expired. The lease lapses after
+    `seconds`, so a process that dies while holding it cannot block others.
+    """
+    conn = get_db()
+    now = time.time()
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO leases (name, owner, expires) VALUES (?, NULL, 0)", (name,))
+        claimed = conn.execute(
+            "UPDATE leases SET owner = ?, expires = ? WHERE name = ? AND expires < ?",
+            (owner, now + seconds, name, now)
+        ).rowcount
+    return claimed == 1
+
+
+def release_lease(name, owner):
+    conn = get_db()
+    with conn:
+        conn.execute("UPDATE leases SET expires = 0 WHERE name = ? AND owner = ?", (name, owner))
+
+
+def lease_held(name):
+    row = get_db().execute("SELECT expires FROM leases WHERE name = ?", (name,)).fetchone()
+    return bool(row) and row["expires"] > time.time()
+
+
+def save_job(job_id, description, status, created):
+    """Record a newly queued background job, owned by this process"""
+    conn = get_db()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, description, status, pid, created) VALUES (?, ?, ?, ?, ?)",
+            (job_id, description, status, os.getpid(), created)
+        )
+
+
+def update_job_status(job_id, status, result=None, error=None):
+    conn = get_db()
+    with conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ? WHERE id = ?",
+            (status, json.dumps(result), error, job_id)
+        )
+
+
+def add_job_update(job_id, seq, update):
+    conn = get_db()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO job_updates (job_id, seq, data) VALUES (?, ?, ?)",
+            (job_id, seq, json.dumps(update))
+        )
+
+
+def load_job(job_id):
+    """A job's stored state as a dict with an update_count, or None"""
+    row = get_db().execute(
+        "SELECT id, description, status, result, error, pid, created, "
+        "(SELECT COUNT(*) FROM job_updates WHERE job_id = jobs.id) AS update_count "
+        "FROM jobs WHERE id = ?",
+        (job_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def load_job_updates(job_id, start=0):
+    """Updates of a job from index `start`, in order"""
+    rows = get_db().execute(
+        "SELECT data FROM job_updates WHERE job_id = ? AND seq >= ? ORDER BY seq",
+        (job_id, start)
+    ).fetchall()
+    return [json.loads(row["data"]) for row in rows]
+
+
+def delete_jobs(job_ids):
+    conn = get_db()
+    with conn:
+        conn.executemany("DELETE FROM job_updates WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+        conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+
+def save_question(question, options, answer):
+    conn = get_db()
+    with conn:
+        conn.execute(
+            "INSERT INTO questions (question, options, answer) VALUES (?, ?, ?)",
+            (question, json.dumps(options), answer)
+        )
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('questions_version', 0)")
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'questions_version'")
+
+
+def load_questions():
+    """The question bank as a shared tuple; callers must not modify it"""
+    global _questions_cache
+    try:
+        # One primary-key lookup instead of re-reading the whole bank
+        version = get_meta("questions_version")
+    except sqlite3.Error:
+        return ()
+    cached = _questions_cache
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _questions_lock:
+        if _questions_cache is None or _questions_cache[0] != version:
+            try:
+                # Version before rows: a question saved in between only costs
+                # one extra reload, never a stale cache
+                version = get_meta("questions_version")
+                rows = get_db().execute("SELECT question, options, answer FROM questions ORDER BY id").fetchall()
+            except sqlite3.Error:
+                return ()
+            _questions_cache = (version, tuple(
+                {"question": row["question"], "options": json.loads(row["options"]), "answer": row["answer"]}
+                for row in rows
+            ))
+        return _questions_cache[1]
+
+
 def evaluate(student_answers):
     correct = 0
     total = len(student_answers)
@@ -41,49 +299,90 @@ def evaluate(student_answers):
 
 
 def save_student_result(name, score, total):
-    data = []
-    if os.path.exists(STUDENT_DATA_FILE):
-        with open(STUDENT_DATA_FILE, "r") as f:
-            try:
-                data = json.load(f)
-            except:
-                data = []
-    data.append({"name": name, "score": score, "total": total})
-    with open(STUDENT_DATA_FILE, "w") as f:
-        json.dump(data, f)
+    conn = get_db()
+    with conn:
+        conn.execute(
+            "INSERT INTO results (name, score, total) VALUES (?, ?, ?)",
+            (name, score, total)
+        )
 
 
 def load_student_analysis():
-    if os.path.exists(STUDENT_DATA_FILE):
-        with open(STUDENT_DATA_FILE, "r") as f:
-            try:
-                return json.load(f)
-            except:
-                return []
-    return []
+    try:
+        rows = get_db().execute("SELECT name, score, total FROM results ORDER BY id").fetchall()
+    except sqlite3.Error:
+        return []
+    return [{"name": row["name"], "score": row["score"], "total": row["total"]} for row in rows]
 
 
 def save_test_submission(name, questions, answers):
-    """Save a student's test submission to a JSON file"""
-    submissions = []
-    if os.path.exists(TEST_SUBMISSIONS_FILE):
-        with open(TEST_SUBMISSIONS_FILE, "r", encoding="utf-8") as f:
-            try:
-                submissions = json.load(f)
-            except:
-                submissions = []
-    
-    # Create submission object
-    submission = {
-        "student_name": name,
-        "timestamp": str(datetime.datetime.now()),
-        "questions_and_answers": [
-            {"question": q, "answer": a} 
-            for q, a in zip(questions, answers)
-        ]
-    }
-    
-    submissions.append(submission)
-    
-    with open(TEST_SUBMISSIONS_FILE, "w", encoding="utf-8") as f:
-        json.dump(submissions, f, indent=2)
\ No newline at end of file
+    """Save a student's test submission"""
+    questions_and_answers = [
+        {"question": q, "answer": a}
+        for q, a in zip(questions, answers)
+    ]
+    conn = get_db()
+    with conn:
+        conn.execute(
+            "INSERT INTO submissions (student_name, timestamp, questions_and_answers) VALUES (?, ?, ?)",
+            (name, str(datetime.datetime.now()), json.dumps(questions_and_answers))
+        )
+
+
+def save_submissions_batch(records):
+    """
+    Persist several submissions and their results in one transaction
+
+    Args:
+        records (list): dicts with name, questions, answers, score, total and
+            timestamp keys
+    """
+    conn = get_db()
+    with conn:
+        conn.executemany(
+            "INSERT INTO submissions (student_name, timestamp, questions_and_answers) VALUES (?, ?, ?)",
+            [
+                (r["name"], r["timestamp"], json.dumps([
+                    {"question": q, "answer": a}
+                    for q, a in zip(r["questions"], r["answers"])
+                ]))
+                for r in records
+            ]
+        )
+        conn.executemany(
+            "INSERT INTO results (name, score, total) VALUES (?, ?, ?)",
+            [(r["name"], r["score"], r["total"]) for r in records if r["name"]]
+        )
+
+
+def load_analysis_summary(key):
+    """Cached per-student analysis summary, or None"""
+    row = get_db().execute("SELECT summary FROM analysis_summaries WHERE key = ?", (key,)).fetchone()
+    return row["summary"] if row else None
+
+
+def save_analysis_summary(key, student_name, summary):
+    conn = get_db()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO analysis_summaries (key, student_name, summary) VALUES (?, ?, ?)",
+            (key, student_name, summary)
+        )
+
+
+def load_test_submissions():
+    """All test submissions in the order they were received"""
+    try:
+        rows = get_db().execute(
+            "SELECT student_name, timestamp, questions_and_answers FROM submissions ORDER BY id"
+        ).fetchall()
+    except sqlite3.Error:
+        return []
+    return [
+        {
+            "student_name": row["student_name"],
+            "timestamp": row["timestamp"],
+            "questions_and_answers": json.loads(row["questions_and_answers"])
+        }
+        for row in rows
+    ]
@@ -0,0 +1,140 @@
+import numpy as np
+
+
+def top_k(scores, k):
+    """
+    Indices and values of the k largest scores in each row, best first
+
+    Uses argpartition so only the k winners are sorted, not the whole row.
+    """
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64), np.zeros((scores.shape[0], 0), dtype=scores.dtype)
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class ExactIndex:
+    """Brute-force inner-product search over unit-length vectors"""
+
+    def __init__(self):
+        self._vectors = None
+        self.size = 0
+
+    @property
+    def vectors(self):
+        if self._vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._vectors[:self.size]
+
+    def add(self, vectors):
+        """Append vectors; ids continue from the current size"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            return
+        if self._vectors is None:
+            self._vectors = np.empty((max(len(vectors), 64), vectors.shape[1]), dtype=np.float32)
+        elif self.size + len(vectors) > len(self._vectors):
+            # Grow geometrically so repeated inserts stay amortized O(1)
+            grown = np.empty((max(2 * len(self._vectors), self.size + len(vectors)), vectors.shape[1]), dtype=np.float32)
+            grown[:self.size] = self._vectors[:self.size]
+            self._vectors = grown
+        self._vectors[self.size:self.size + len(vectors)] = vectors
+        self.size += len(vectors)
+
+    def search(self, queries, k):
+        """(ids, scores) arrays of shape (len(queries), k), best first"""
+        queries = np.atleast_2d(queries)
+        if self.size == 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+        return top_k(queries @ self.vectors.T, k)
+
+
+class IVFIndex(ExactIndex):
+    """
+    Inverted-file index: vectors are bucketed by their nearest k-means
+    centroid and a query only scans the `nprobe` closest buckets
+
+    Below `train_size` vectors it searches exactly. Once trained, new vectors
+    are assigned to their bucket on insertion; the centroids are retrained
+    when the index has grown 4x since the last training.
+    """
+
+    def __init__(self, nprobe=8, train_size=2048, iterations=10, seed=0):
+        super().__init__()
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.iterations = iterations
+        self.rng = np.random.default_rng(seed)
+        self.centroids = None
+        self.lists = []
+        self.trained_size = 0
+
+    def add(self, vectors):
+        start = self.size
+        super().add(vectors)
+        if self.centroids is None or self.size > 4 * self.trained_size:
+            if self.size >= self.train_size:
+                self.train()
+        else:
+            self._assign(np.arange(start, self.size))
+
+    def train(self):
+        """Spherical k-means over the current vectors, then rebuild the buckets"""
+        vectors = self.vectors
+        nlist = max(1, int(np.sqrt(len(vectors))))
+        centroids = vectors[self.rng.choice(len(vectors), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = vectors[assignment == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                else:
+                    centroid = vectors[self.rng.integers(len(vectors))]  # Reseed empty bucket
+                centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        self.centroids = centroids
+        self.lists = [np.zeros(0, dtype=np.int64) for _ in range(nlist)]
+        self.trained_size = self.size
+        self._assign(np.arange(self.size))
+
+    def _assign(self, ids):
+        if len(ids) == 0:
+            return
+        assignment = np.argmax(self.vectors[ids] @ self.centroids.T, axis=1)
+        for c in np.unique(assignment):
+            self.lists[c] = np.concatenate([self.lists[c], ids[assignment == c]])
+
+    def search(self, queries, k):
+        queries = np.atleast_2d(queries)
+        if self.centroids is None:
+            return super().search(queries, k)
+
+        k = min(k, self.size)
+        probes, _ = top_k(queries @ self.centroids.T, self.nprobe)
+        ids = np.zeros((len(queries), k), dtype=np.int64)
+        scores = np.zeros((len(queries), k), dtype=np.float32)
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([self.lists[c] for c in probes[i]])
+            if len(candidates) < k:
+                # Too few vectors near this query: fall back to a full scan
+                candidates = np.arange(self.size)
+            best, best_scores = top_k(self.vectors[candidates] @ query, k)
+            ids[i] = candidates[best[0]]
+            scores[i] = best_scores[0]
+        return ids, scores
+
+
+def make_index(kind="exact", **kwargs):
+    """Build an index: "exact" for brute force, "ivf" (opt-in) for approximate search on large corpora"""
+    if kind == "exact":
+        return ExactIndex()
+    if kind == "ivf":
+        return IVFIndex(**kwargs)
+    raise ValueError(f"Unknown index type: {kind}")